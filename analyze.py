@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# Aggregate statistics over directories of Capitals game logs (as dumped by runner.py or tournament.py): win rates by
+# colour, game lengths, word lengths, capital captures, territory per round and skip/timeout/invalid play rates. Logs
+# are summarized in parallel, one game at a time, and folded into running totals, so memory use doesn't grow with the
+# number of logs.
+
+import os
+import csv
+import sys
+import json
+import argparse
+import multiprocessing
+import runner
+
+from capitals import Dictionary, GameLog, GameLogReader, LetterGenerator, RED, BLUE
+
+def find_logs(paths):
+    """
+    Generate the game log files (.json or .jsonl) under the given files and directories, recursively, in sorted order.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        for directory, subdirectories, files in os.walk(path):
+            subdirectories.sort()
+            for name in sorted(files):
+                if name.endswith(".json") or name.endswith(".jsonl"):
+                    yield os.path.join(directory, name)
+
+def analyze_log(file_name, dictionary, lettergen = None):
+    """
+    Summarize a single game log (a JSON log or a streamed JSON-lines log) as a JSON-friendly map with the competitor
+    names, the winner, the number of turns and rounds, the count of each played word length, and, per colour, the number
+    of turns, capital captures, skipped turns, timeouts and invalid plays, along with the territory sizes of both
+    colours at the end of each round. Streamed logs are read one turn at a time.
+    """
+    lettergen = lettergen or LetterGenerator()
+    if file_name.endswith(".jsonl"):
+        with GameLogReader(file_name, dictionary, lettergen) as reader:
+            return _summarize_turns(file_name, reader.red_name, reader.blue_name, reader.initial_state, reader)
+
+    log = GameLog.from_file(file_name, dictionary, lettergen)
+    return _summarize_turns(file_name, log.red_name, log.blue_name, log.states[0],
+            zip(log.actions, log.states[1:], log.metrics))
+
+def _summarize_turns(file_name, red_name, blue_name, initial_state, turns):
+    """
+    Summarize a game from its initial state and its (action, state, metrics) turns, for analyze_log().
+    """
+    game = { "file": file_name, "red": red_name, "blue": blue_name, "turns": 0, "word_lengths": {},
+            "colors": { color: { "turns": 0, "captures": 0, "skips": 0, "timeouts": 0, "invalid": 0 }
+                    for color in (RED, BLUE) } }
+    territory = []
+
+    state = initial_state
+    for action, new_state, metrics in turns:
+        counts = game["colors"][state.turn]
+        counts["turns"] += 1
+        game["turns"] += 1
+        if action is None:
+            if metrics is not None and metrics.get("timed_out"):
+                counts["timeouts"] += 1
+            elif metrics is not None and metrics.get("invalid"):
+                counts["invalid"] += 1
+            else:
+                counts["skips"] += 1
+        else:
+            length = str(len(action))
+            game["word_lengths"][length] = game["word_lengths"].get(length, 0) + 1
+            # Capturing the enemy capital is the only way to get another turn.
+            if new_state.turn == state.turn:
+                counts["captures"] += 1
+
+        # Territory is sampled at the end of every round: a state's round is the round about to be played, so the
+        # round ends with the move which changes it.
+        round_ended = new_state.round != state.round
+        if round_ended:
+            territory.append([new_state.board.territory_size(RED), new_state.board.territory_size(BLUE)])
+        state = new_state
+
+    # A game which stops partway through a round (or before any turn) ends that round with its final state.
+    if not territory or not round_ended:
+        territory.append([state.board.territory_size(RED), state.board.territory_size(BLUE)])
+    game["winner"] = state.winner()
+    game["rounds"] = state.round
+    game["territory"] = territory
+    return game
+
+class Summary(object):
+    """
+    Running totals over many game summaries (from analyze_log()); each game is added and then dropped, so a summary's
+    size only depends on the longest game and the longest word, never on the number of games.
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.errors = 0
+        self.wins = { RED: 0, BLUE: 0, None: 0 }
+        self.turn_counts = {}
+        self.round_counts = {}
+        self.word_lengths = {}
+        self.colors = { color: { "turns": 0, "captures": 0, "skips": 0, "timeouts": 0, "invalid": 0 }
+                for color in (RED, BLUE) }
+        # Round -> [total red territory, total blue territory, games which reached the end of the round].
+        self.territory = {}
+
+    def add(self, game):
+        """
+        Add a game summary to the totals.
+        """
+        self.games += 1
+        self.wins[game["winner"]] += 1
+        self.turn_counts[game["turns"]] = self.turn_counts.get(game["turns"], 0) + 1
+        self.round_counts[game["rounds"]] = self.round_counts.get(game["rounds"], 0) + 1
+        for length, count in game["word_lengths"].items():
+            self.word_lengths[int(length)] = self.word_lengths.get(int(length), 0) + count
+        for color, counts in game["colors"].items():
+            for key, count in counts.items():
+                self.colors[color][key] += count
+        for round_num, (red, blue) in enumerate(game["territory"], 1):
+            totals = self.territory.setdefault(round_num, [0, 0, 0])
+            totals[0] += red
+            totals[1] += blue
+            totals[2] += 1
+
+    def to_json(self):
+        """
+        Return the statistics as a JSON-friendly map.
+        """
+        def rate(count, total):
+            return count / float(total) if total > 0 else None
+
+        def distribution(counts):
+            total = sum(counts.values())
+            return {
+                "mean": rate(sum(value * count for value, count in counts.items()), total),
+                "min": min(counts) if counts else None,
+                "max": max(counts) if counts else None,
+                "counts": { str(value): counts[value] for value in sorted(counts) }
+            }
+
+        return {
+            "games": self.games,
+            "errors": self.errors,
+            "win_rate": { RED: rate(self.wins[RED], self.games), BLUE: rate(self.wins[BLUE], self.games),
+                    "TIE": rate(self.wins[None], self.games) },
+            "game_turns": distribution(self.turn_counts),
+            "game_rounds": distribution(self.round_counts),
+            "word_length": distribution(self.word_lengths),
+            "colors": { color: {
+                "turns": counts["turns"],
+                "captures_per_game": rate(counts["captures"], self.games),
+                "skip_rate": rate(counts["skips"], counts["turns"]),
+                "timeout_rate": rate(counts["timeouts"], counts["turns"]),
+                "invalid_rate": rate(counts["invalid"], counts["turns"])
+            } for color, counts in self.colors.items() },
+            "territory": [{ "round": round_num, "games": games, RED: red / float(games), BLUE: blue / float(games) }
+                    for round_num, (red, blue, games) in sorted(self.territory.items())]
+        }
+
+    def to_rows(self):
+        """
+        Return the statistics as flat (statistic, key, value) rows, for CSV output.
+        """
+        stats = self.to_json()
+        rows = [("games", "", stats["games"]), ("errors", "", stats["errors"])]
+        rows += [("win_rate", key, value) for key, value in sorted(stats["win_rate"].items())]
+        for name in ("game_turns", "game_rounds", "word_length"):
+            rows += [(name, key, stats[name][key]) for key in ("mean", "min", "max")]
+            rows += [(name + "_count", key, value) for key, value in stats[name]["counts"].items()]
+        for color, counts in sorted(stats["colors"].items()):
+            rows += [(key, color, value) for key, value in sorted(counts.items())]
+        for totals in stats["territory"]:
+            rows += [("territory_" + color.lower(), totals["round"], totals[color]) for color in (RED, BLUE)]
+
+        return rows
+
+def _analyze_task(file_name):
+    """
+    Summarize a single log in a worker process, returning (file name, game summary or None, error message or None).
+    """
+    try:
+        return file_name, analyze_log(file_name, runner.worker_dictionary()), None
+    except (OSError, ValueError, KeyError, IndexError, TypeError) as error:
+        return file_name, None, "%s: %s" % (type(error).__name__, error)
+
+def analyze(paths, dictionary, workers = 1, on_game = None, on_error = None):
+    """
+    Summarize every game log under the given paths into a Summary, using the given number of worker processes. Logs
+    which can't be read are counted as errors rather than stopping the analysis. If given, on_game is called with each
+    game summary and on_error with (file name, message) for each unreadable log, as they finish (in no particular order
+    when workers > 1).
+    """
+    summary = Summary()
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, runner.init_worker, (dictionary,))
+        finished = pool.imap_unordered(_analyze_task, find_logs(paths), chunksize=16)
+    else:
+        runner.init_worker(dictionary)
+        finished = map(_analyze_task, find_logs(paths))
+
+    try:
+        for file_name, game, error in finished:
+            if game is None:
+                summary.errors += 1
+                if on_error is not None:
+                    on_error(file_name, error)
+                continue
+
+            summary.add(game)
+            if on_game is not None:
+                on_game(game)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    return summary
+
+GAME_COLUMNS = ["file", "red", "blue", "winner", "turns", "rounds", "red_captures", "blue_captures", "red_skips",
+        "blue_skips", "red_timeouts", "blue_timeouts", "red_invalid", "blue_invalid", "red_territory", "blue_territory"]
+
+def game_row(game):
+    """
+    Flatten a game summary into a row of GAME_COLUMNS, with the final territory sizes.
+    """
+    row = [game["file"], game["red"], game["blue"], game["winner"] or "TIE", game["turns"], game["rounds"]]
+    for key in ("captures", "skips", "timeouts", "invalid"):
+        row += [game["colors"][RED][key], game["colors"][BLUE][key]]
+    return row + game["territory"][-1]
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Aggregate statistics over Capitals game logs")
+    argparser.add_argument("paths", type=str, nargs="+", help="Log files, or directories to search for logs")
+    argparser.add_argument("--workers", type=int, default=1, help="Number of processes to read logs in parallel")
+    argparser.add_argument("--dictionary", type=str, default="dict.txt", help="Dictionary file to load")
+    argparser.add_argument("--json", type=str, default=None, help="File to write the statistics to as JSON")
+    argparser.add_argument("--csv", type=str, default=None, help="File to write the statistics to as CSV")
+    argparser.add_argument("--games", type=str, default=None,
+            help="CSV file to write one row per game to, as games are read")
+    args = argparser.parse_args()
+
+    dictionary = Dictionary.from_compiled(args.dictionary)
+    games_file = open(args.games, "w", newline="") if args.games is not None else None
+    games_writer = None
+    if games_file is not None:
+        games_writer = csv.writer(games_file)
+        games_writer.writerow(GAME_COLUMNS)
+
+    try:
+        summary = analyze(args.paths, dictionary, workers=args.workers,
+                on_game=lambda game: games_writer.writerow(game_row(game)) if games_writer is not None else None,
+                on_error=lambda file_name, error: print("Failed to read %s (%s)" % (file_name, error),
+                        file=sys.stderr))
+    finally:
+        if games_file is not None:
+            games_file.close()
+
+    if args.json is not None:
+        with open(args.json, "w") as json_file:
+            json.dump(summary.to_json(), json_file, indent=2)
+    if args.csv is not None:
+        with open(args.csv, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["statistic", "key", "value"])
+            writer.writerows(summary.to_rows())
+    if args.json is None and args.csv is None:
+        print(json.dumps(summary.to_json(), indent=2))
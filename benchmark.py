@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# Microbenchmarks for the Capitals engine; each benchmark prints the average time per call of the operations it
+# measures, so that changes to the engine can be compared against each other.
+
+import random
+import timeit
+import argparse
+import geometry
+import capitals
+
+from collections import Counter
+from capitals import State, Dictionary, Board, LetterGenerator
+
+def report(name, func, number):
+    """
+    Time the given function, printing the average time per call in microseconds.
+    """
+    seconds = timeit.timeit(func, number=number)
+    print("  %-40s %10.2f us" % (name, seconds / number * 1e6))
+    return seconds / number
+
+def random_state(dictionary, turns, seed=0):
+    """
+    Play random tiles for the given number of turns from the initial state, returning a mid-game state.
+    """
+    random.seed(seed)
+    state = State.initial(dictionary, LetterGenerator(seed))
+    for _ in range(turns):
+        letters = list(state.board.find_all_letters())
+        tiles = random.sample(letters, min(len(letters), 4))
+        new_board, captured = state.board.use_tiles(tiles, state.turn, state.lettergen)
+        state = state.next_turn(new_board, captured)
+
+    return state
+
+# The geometry helpers and dict-backed tile lookups as they were before the geometry tables, kept as the baseline for
+# bench_geometry.
+def baseline_valid_position(pos):
+    x_constraint = geometry.BOARD_CONSTRAINTS[pos[1]] if pos[1] in geometry.BOARD_CONSTRAINTS else (1, 0)
+    return pos[0] >= x_constraint[0] and pos[0] <= x_constraint[1]
+
+def baseline_valid_positions():
+    result = []
+    for y, x_constraint in geometry.BOARD_CONSTRAINTS.items():
+        x_min, x_max = x_constraint
+        for x in range(x_min, x_max + 1):
+            result.append((x, y))
+
+    return result
+
+def baseline_adjacent_positions(pos):
+    result = []
+    for offset_x, offset_y in geometry.ADJACENT_OFFSETS:
+        offset_pos = (pos[0] + offset_x, pos[1] + offset_y)
+        if baseline_valid_position(offset_pos):
+            result.append(offset_pos)
+
+    return result
+
+def baseline_get_tile(tiles, position):
+    if position not in tiles:
+        if baseline_valid_position(position):
+            return capitals.EMPTY
+        else:
+            raise IndexError("Position " + repr(position) + " is not a valid board position")
+    return tiles[position]
+
+def bench_geometry(dictionary, args):
+    """
+    Compare the precomputed geometry tables against the list-building geometry helpers they replaced, and time the
+    geometry queries an engine turn makes with each.
+    """
+    number = args.number
+    print("== geometry ==")
+    pos = (3, 4)
+    baseline = report("valid_positions() (baseline)", baseline_valid_positions, number)
+    lookup = report("valid_positions()", capitals.valid_positions, number)
+    print("  -> %.1fx faster" % (baseline / lookup))
+
+    baseline = report("adjacent_positions(pos) (baseline)", lambda: baseline_adjacent_positions(pos), number)
+    lookup = report("adjacent_positions(pos)", lambda: capitals.adjacent_positions(pos), number)
+    print("  -> %.1fx faster" % (baseline / lookup))
+
+    state = random_state(dictionary, 20)
+    board = state.board
+    tiles = { pos: tile for pos, tile in board.board.items() if tile != capitals.EMPTY }
+    letters = list(board.find_all_letters())[:4]
+
+    def baseline_turn():
+        # The geometry work of a turn before the tables, on a dict of tiles: territory scans, capital lookups and
+        # adjacency checks.
+        for color in (capitals.RED, capitals.BLUE):
+            [p for p in baseline_valid_positions() if baseline_get_tile(tiles, p) in (color, color + "_CAPITAL")]
+            next((p for p in baseline_valid_positions() if baseline_get_tile(tiles, p) == color + "_CAPITAL"), None)
+        for tile in letters:
+            baseline_adjacent_positions(tile)
+
+    def table_turn():
+        # Drop the board's cached views, so this measures the tables rather than the cache.
+        board._derived = None
+        for color in (capitals.RED, capitals.BLUE):
+            board.territory(color)
+            board.capital(color)
+        for tile in letters:
+            capitals.adjacent_positions(tile)
+
+    baseline = report("turn queries (baseline)", baseline_turn, number // 10)
+    lookup = report("turn queries (tables)", table_turn, number // 10)
+    print("  -> %.1fx faster" % (baseline / lookup))
+
+def bench_dictionary(dictionary, args):
+    """
+    Compare finding the playable words for a board by scanning the whole dictionary against the signature trie.
+    """
+    number = args.number
+    print("== dictionary ==")
+    state = random_state(dictionary, 20)
+    letter_counts = Counter(state.board.find_all_letters().values())
+
+    def scan():
+        return [word for word in dictionary
+                if all(letter_counts.get(letter, 0) >= count for letter, count in Counter(word).items())]
+
+    report("signature trie build", dictionary.signature_trie, 1)
+    scanned = report("full dictionary scan", scan, max(1, number // 1000))
+    indexed = report("playable_words()", lambda: list(dictionary.playable_words(letter_counts)), max(1, number // 100))
+    print("  -> %.1fx faster" % (scanned / indexed))
+
+def bench_matrix(dictionary, args):
+    """
+    Compare per-board word feasibility checks against the batched NumPy letter matrix, over many boards at once.
+    """
+    number = args.number
+    print("== matrix ==")
+    if capitals.np is None:
+        print("  NumPy is not installed, skipping")
+        return
+
+    boards = [random_state(dictionary, turns, seed=turns) for turns in range(0, 50)]
+    board_counts = [Counter(state.board.find_all_letters().values()) for state in boards]
+    vectors = capitals.np.stack([capitals.letter_vector(counts) for counts in board_counts])
+
+    report("letter matrix build", dictionary.letter_matrix, 1)
+    indexed = report("playable_words() per board", lambda: [list(dictionary.playable_words(counts))
+            for counts in board_counts], max(1, number // 1000))
+    batched = report("feasible_mask_batch()", lambda: dictionary.feasible_mask_batch(vectors), max(1, number // 1000))
+    print("  -> %.1fx faster for %d boards" % (indexed / batched, len(boards)))
+
+def bench_startup(dictionary, args):
+    """
+    Compare loading the dictionary and its signature index from the text file against the compiled dictionary.
+    """
+    number = args.number
+    print("== startup ==")
+    Dictionary.from_compiled(args.dictionary)
+
+    parsed = report("from_file() + signature_trie()",
+            lambda: Dictionary.from_file(args.dictionary).signature_trie(), 1)
+    compiled = report("from_compiled() + signature_trie()",
+            lambda: Dictionary.from_compiled(args.dictionary).signature_trie(), max(1, number // 100))
+    print("  -> %.1fx faster" % (parsed / compiled))
+
+def bench_moves(dictionary, args):
+    """
+    Compare scoring candidate moves by building a result board for each against batch move evaluation.
+    """
+    number = args.number
+    print("== moves ==")
+    state = random_state(dictionary, 20)
+    letters = list(state.board.find_all_letters())
+    moves = [random.sample(letters, min(len(letters), length)) for length in range(1, 9) for _ in range(8)]
+
+    def per_move():
+        return [len(state.board.use_tiles(move, state.turn)[0].territory(state.turn)) for move in moves]
+
+    boards = report("use_tiles() per move", per_move, max(1, number // 100))
+    batched = report("evaluate_moves()", lambda: state.board.evaluate_moves(moves, state.turn), max(1, number // 100))
+    print("  -> %.1fx faster for %d moves" % (boards / batched, len(moves)))
+
+def bench_encoding(dictionary, args):
+    """
+    Compare decoding boards from their JSON maps against the packed byte encoding, singly and in NumPy batches.
+    """
+    number = args.number
+    print("== encoding ==")
+    boards = [random_state(dictionary, turns, seed=turns).board for turns in range(0, 50)]
+    maps = [Board.to_json(board) for board in boards]
+    packed = [Board.to_bytes(board) for board in boards]
+
+    parsed = report("Board.from_json() x %d" % len(boards), lambda: [Board.from_json(m) for m in maps],
+            max(1, number // 100))
+    unpacked = report("Board.from_bytes() x %d" % len(boards), lambda: [Board.from_bytes(p) for p in packed],
+            max(1, number // 100))
+    print("  -> %.1fx faster" % (parsed / unpacked))
+
+    if capitals.np is None:
+        print("  NumPy is not installed, skipping batch decoding")
+        return
+
+    counted = report("letter_counts() x %d" % len(boards), lambda: [Board.from_bytes(p).letter_counts()
+            for p in packed], max(1, number // 100))
+    batched = report("boards_letter_counts(boards_array())", lambda: capitals.boards_letter_counts(
+            capitals.boards_array(packed)), max(1, number // 100))
+    print("  -> %.1fx faster for %d boards" % (counted / batched, len(boards)))
+
+BENCHMARKS = {
+    "moves": bench_moves,
+    "geometry": bench_geometry,
+    "startup": bench_startup,
+    "dictionary": bench_dictionary,
+    "matrix": bench_matrix,
+    "encoding": bench_encoding,
+}
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Run Capitals engine microbenchmarks")
+    argparser.add_argument("benchmarks", type=str, nargs="*", default=sorted(BENCHMARKS),
+            help="Benchmarks to run (default: all of %s)" % ", ".join(sorted(BENCHMARKS)))
+    argparser.add_argument("--number", type=int, default=10000, help="Number of calls to time per operation")
+    argparser.add_argument("--dictionary", type=str, default="dict.txt", help="Dictionary file to load")
+    args = argparser.parse_args()
+
+    dictionary = Dictionary.from_compiled(args.dictionary)
+    for name in args.benchmarks:
+        BENCHMARKS[name](dictionary, args)
@@ -1,11 +1,29 @@
 #!/usr/bin/env python3
 # Implementation of the Capitals mobile game, with an API amenable to use in AI.
 
+import os
+import sys
+import mmap
 import random
 import re
 import json
+import struct
+import base64
+import bisect
 
-from collections import deque
+from array import array
+from itertools import islice
+from collections import deque, OrderedDict
+
+# NumPy is optional; it is only needed for the vectorised dictionary queries.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from geometry import BOARD_CONSTRAINTS, ADJACENT_OFFSETS, POSITIONS, VALID_POSITIONS, POSITION_INDEX, NEIGHBORS, \
+    NEIGHBOR_INDICES, ALL_MASK, compute_adjacent, positions_mask, mask_indices, mask_positions, neighbor_mask, \
+    flood_mask
 
 class Dictionary(object):
     """
@@ -14,6 +32,8 @@ class Dictionary(object):
 
     def __init__(self, words):
         self.words = words
+        self._signature_trie = None
+        self._letter_matrix = None
 
     def __len__(self):
         return len(self.words)
@@ -21,12 +41,88 @@ class Dictionary(object):
     def __iter__(self):
         return self.words.__iter__()
 
+    def __getstate__(self):
+        # The indexes are rebuilt (or re-mapped) on demand rather than pickled along with the words.
+        return { "words": self.words }
+
+    def __setstate__(self, state):
+        self.__init__(state["words"])
+
     def contains(self, word):
         """
         Return true if the dictionary contains the given word (irrespective of case).
         """
         return word.upper() in self.words
 
+    def signature_trie(self):
+        """
+        Return the sub-multiset index of this dictionary (a SignatureIndex), building it on first use.
+        """
+        if self._signature_trie is None:
+            if isinstance(self.words, CompiledWords):
+                self._signature_trie = self.words.signature_trie()
+            else:
+                self._signature_trie = SignatureIndex.build(sorted(self.words))
+
+        return self._signature_trie
+
+    def playable_words(self, letter_counts, min_length = 1, max_length = None, longest_first = False):
+        """
+        Generates every word in the dictionary which can be made from the given multiset of letters, passed as a map of
+        letter -> count (such as the letter counts of a board). Only words with a length in [min_length, max_length]
+        are produced; if longest_first is True, words are produced in order of decreasing length.
+
+        Only the branches of the signature trie which the letters can complete are visited, so the cost scales with
+        the number of playable words rather than the size of the dictionary.
+        """
+        if max_length is None:
+            max_length = sum(letter_counts.values())
+
+        words = self.signature_trie().playable(letter_counts, min_length, max_length)
+        if longest_first:
+            words = sorted(words, key=len, reverse=True)
+
+        return iter(words)
+
+    def letter_matrix(self):
+        """
+        Return the letter-count matrix of this dictionary (requires NumPy), building it on first use. Only words made
+        entirely of the letters A-Z are included, since no other word can ever be played.
+        """
+        if self._letter_matrix is None:
+            if isinstance(self.words, CompiledWords):
+                self._letter_matrix = self.words.letter_matrix()
+            else:
+                self._letter_matrix = LetterMatrix.from_words(self.words)
+
+        return self._letter_matrix
+
+    def feasible_mask(self, letter_counts):
+        """
+        Return a boolean array which is True for every word in letter_matrix().words which can be made from the
+        given letter counts (either a map of letter -> count or a length-26 count vector).
+        """
+        matrix = self.letter_matrix()
+        return np.all(matrix.counts <= letter_vector(letter_counts), axis=1)
+
+    def feasible_mask_batch(self, letter_counts):
+        """
+        Vectorised feasible_mask() over many boards at once: given an (n_boards, 26) array of letter counts, returns an
+        (n_boards, num_words) boolean array where entry [i, j] is True if word j can be played on board i.
+        """
+        matrix = self.letter_matrix()
+        letter_counts = np.asarray(letter_counts, dtype=np.uint8)
+        if letter_counts.ndim != 2 or letter_counts.shape[1] != len(LETTERS):
+            raise ValueError("Expected an (n_boards, %d) array of letter counts" % len(LETTERS))
+
+        # Compare one letter at a time, which keeps the temporaries at (n_boards, num_words) booleans.
+        result = np.ones((letter_counts.shape[0], len(matrix.words)), dtype=bool)
+        for letter in range(len(LETTERS)):
+            if matrix.used_letters[letter]:
+                result &= matrix.counts[:, letter] <= letter_counts[:, letter, None]
+
+        return result
+
     @staticmethod
     def from_file(file_name):
         """
@@ -42,6 +138,23 @@ class Dictionary(object):
 
         return Dictionary(words)
 
+    @staticmethod
+    def from_compiled(file_name, compiled_name = None):
+        """
+        Load a dictionary file through its compiled form (by default, <file_name>.compiled), which is rebuilt
+        automatically whenever the dictionary file changes. The compiled form is memory-mapped rather than parsed, so
+        loading takes near-constant time and processes loading the same dictionary share its pages.
+        """
+        compiled_name = compiled_name or file_name + ".compiled"
+        source_stat = os.stat(file_name)
+
+        words = CompiledWords.open(compiled_name, source_stat)
+        if words is None:
+            CompiledWords.write(compiled_name, Dictionary.from_file(file_name).words, source_stat)
+            words = CompiledWords.open(compiled_name, source_stat)
+
+        return Dictionary(words)
+
     @staticmethod
     def from_list(word_list):
         """
@@ -51,12 +164,360 @@ class Dictionary(object):
         return Dictionary(set(map(lambda k: k.upper(), word_list)))
 
 
+# The letters which can appear on the board, in the order used for letter-count vectors.
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_LETTER_SET = frozenset(LETTERS)
+
+def letter_vector(letter_counts):
+    """
+    Convert a map of letter -> count into a NumPy uint8 vector of counts indexed like LETTERS; count vectors are
+    returned as-is.
+    """
+    if np is None:
+        raise ImportError("NumPy is required for letter-count vectors")
+
+    if hasattr(letter_counts, "get"):
+        return np.array([letter_counts.get(letter, 0) for letter in LETTERS], dtype=np.uint8)
+
+    return np.asarray(letter_counts, dtype=np.uint8)
+
+class LetterMatrix(object):
+    """
+    A dense letter-count matrix for the words of a dictionary, used to test many words for feasibility at once:
+    counts[i, j] is the number of times LETTERS[j] appears in words[i], and lengths[i] is the length of words[i].
+    """
+    def __init__(self, words, counts):
+        self.words = words
+        self.counts = counts
+        self.lengths = counts.sum(axis=1, dtype=np.uint16)
+        self.used_letters = counts.any(axis=0)
+
+    def __len__(self):
+        return len(self.words)
+
+    @staticmethod
+    def from_words(words):
+        """
+        Build a letter matrix for the given words; only words made entirely of the letters A-Z are included.
+        """
+        if np is None:
+            raise ImportError("NumPy is required to build a letter matrix")
+
+        words = sorted(word for word in words if set(word) <= _LETTER_SET)
+        counts = np.zeros((len(words), len(LETTERS)), dtype=np.uint8)
+        for row, word in enumerate(words):
+            for letter in word:
+                counts[row, ord(letter) - ord("A")] += 1
+
+        return LetterMatrix(words, counts)
+
+class _SignatureNode(object):
+    """
+    A node in a signature trie while it is being built.
+    """
+    __slots__ = ("children", "words")
+
+    def __init__(self):
+        # Map of next signature letter -> child node.
+        self.children = {}
+        # Ids of the words whose signature ends at this node.
+        self.words = []
+
+class SignatureIndex(object):
+    """
+    The sub-multiset index of a dictionary: a trie over the sorted letters (signature) of every word, used to find all
+    of the words which can be made from a multiset of letters. Only words made entirely of the letters A-Z are indexed.
+
+    The trie is stored as flat arrays so that it can be saved in a compiled dictionary and memory-mapped. Node 0 is the
+    root; the children of node n are the nodes child_starts[n] to child_starts[n] + child_counts[n], and the words
+    whose signature ends at node n are word_ids[word_starts[n]:word_starts[n + 1]] (indices into <words>).
+    """
+    def __init__(self, words, letters, heights, child_starts, child_counts, word_starts, word_ids):
+        self.words = words
+        # Character code of the letter on the edge into each node.
+        self.letters = letters
+        # Length of the longest signature suffix below each node.
+        self.heights = heights
+        self.child_starts = child_starts
+        self.child_counts = child_counts
+        self.word_starts = word_starts
+        self.word_ids = word_ids
+
+    def __len__(self):
+        return len(self.letters)
+
+    @staticmethod
+    def build(words):
+        """
+        Build the index for the given sequence of words.
+        """
+        root = _SignatureNode()
+        for word_id, word in enumerate(words):
+            if not set(word) <= _LETTER_SET:
+                continue
+
+            node = root
+            for letter in sorted(word):
+                child = node.children.get(letter)
+                if child is None:
+                    child = node.children[letter] = _SignatureNode()
+                node = child
+            node.words.append(word_id)
+
+        # Flatten the trie breadth-first, so that the children of every node are contiguous.
+        letters = array("B", [0])
+        child_starts = array("I")
+        child_counts = array("B")
+        word_starts = array("I")
+        word_ids = array("I")
+
+        nodes = [root]
+        for node in nodes:
+            child_starts.append(len(nodes))
+            child_counts.append(len(node.children))
+            word_starts.append(len(word_ids))
+            word_ids.extend(node.words)
+            for letter in sorted(node.children):
+                letters.append(ord(letter))
+                nodes.append(node.children[letter])
+        word_starts.append(len(word_ids))
+
+        # Children always come after their parent, so heights can be filled in from the last node backwards.
+        heights = array("B", bytes(len(nodes)))
+        for node in range(len(nodes) - 1, -1, -1):
+            start = child_starts[node]
+            for child in range(start, start + child_counts[node]):
+                heights[node] = max(heights[node], heights[child] + 1)
+
+        return SignatureIndex(words, letters, heights, child_starts, child_counts, word_starts, word_ids)
+
+    def playable(self, letter_counts, min_length, max_length):
+        """
+        Generate the words which can be made from the given map of letter -> count, with a length in
+        [min_length, max_length]; only the branches of the trie which the letters can complete are visited.
+        """
+        available = [0] * 128
+        for letter, count in letter_counts.items():
+            if letter in _LETTER_SET:
+                available[ord(letter)] = count
+
+        return self._playable(0, available, 0, 0, 0, min_length, max_length)
+
+    def _playable(self, node, available, last_letter, run, depth, min_length, max_length):
+        """
+        Generate the playable words below the given node; <last_letter> is the letter used to reach this node, which
+        has been used <run> times in a row, and <depth> is the number of letters used so far.
+        """
+        if depth >= min_length:
+            for index in range(self.word_starts[node], self.word_starts[node + 1]):
+                yield self.words[self.word_ids[index]]
+
+        if depth >= max_length or depth + self.heights[node] < min_length:
+            return
+
+        start = self.child_starts[node]
+        for child in range(start, start + self.child_counts[node]):
+            letter = self.letters[child]
+            used = run + 1 if letter == last_letter else 1
+            if available[letter] >= used:
+                yield from self._playable(child, available, letter, used, depth + 1, min_length, max_length)
+
+class CompiledWords(object):
+    """
+    The sorted words of a compiled dictionary, memory-mapped from a file along with their letter counts, lengths and
+    signature index. Supports len(), iteration, indexing and (binary search) membership tests like a list of words.
+
+    A compiled dictionary file is a header followed by a series of native-endian arrays (see _sections()); the header
+    records the size and modification time of the dictionary file it was compiled from, so that stale files can be
+    detected and rebuilt.
+    """
+    MAGIC = b"CAPDICT\0"
+    VERSION = 1
+    # Magic, version, byte order, source size, source mtime (ns), number of words, word bytes, trie nodes, trie words.
+    HEADER = struct.Struct("<8sII QqIIII")
+
+    def __init__(self, data, sections, file_name = None):
+        self._data = data
+        self._sections = sections
+        self.file_name = file_name
+        self._offsets = self._section("offsets")
+        self._blob_start = sections["blob"][0]
+
+    def _section(self, name):
+        """
+        Return a typed memoryview of the section with the given name.
+        """
+        start, typecode, count = self._sections[name]
+        size = array(typecode).itemsize * count
+        return memoryview(self._data)[start:start + size].cast(typecode)
+
+    @staticmethod
+    def _sections(num_words, blob_size, num_nodes, num_trie_words):
+        """
+        Return the layout of a compiled dictionary file as a map of section name -> (offset, typecode, count), where
+        every section starts on an 8-byte boundary after the header.
+        """
+        layout = [("offsets", "I", num_words + 1), ("blob", "B", blob_size),
+                ("counts", "B", num_words * len(LETTERS)), ("lengths", "B", num_words),
+                ("letters", "B", num_nodes), ("heights", "B", num_nodes), ("child_starts", "I", num_nodes),
+                ("child_counts", "B", num_nodes), ("word_starts", "I", num_nodes + 1), ("word_ids", "I", num_trie_words)]
+
+        sections = {}
+        offset = CompiledWords.HEADER.size
+        for name, typecode, count in layout:
+            offset = (offset + 7) & ~7
+            sections[name] = (offset, typecode, count)
+            offset += array(typecode).itemsize * count
+
+        return sections
+
+    @staticmethod
+    def write(file_name, words, source_stat):
+        """
+        Compile the given words into a compiled dictionary file, recording the os.stat() of the source file. The file
+        is written to a temporary file first and moved into place, so concurrent readers never see a partial file.
+        """
+        words = sorted(words)
+        encoded = [word.encode("utf-8") for word in words]
+        offsets = array("I", [0])
+        for word in encoded:
+            offsets.append(offsets[-1] + len(word))
+
+        counts = bytearray(len(words) * len(LETTERS))
+        for row, word in enumerate(words):
+            for letter in word:
+                if letter in _LETTER_SET:
+                    counts[row * len(LETTERS) + ord(letter) - ord("A")] += 1
+        lengths = bytes(min(len(word), 255) for word in words)
+
+        index = SignatureIndex.build(words)
+        arrays = { "offsets": offsets, "blob": b"".join(encoded), "counts": counts, "lengths": lengths,
+                "letters": index.letters, "heights": index.heights, "child_starts": index.child_starts,
+                "child_counts": index.child_counts, "word_starts": index.word_starts, "word_ids": index.word_ids }
+
+        header = CompiledWords.HEADER.pack(CompiledWords.MAGIC, CompiledWords.VERSION, sys.byteorder == "little",
+                source_stat.st_size, source_stat.st_mtime_ns, len(words), offsets[-1], len(index),
+                len(index.word_ids))
+        sections = CompiledWords._sections(len(words), offsets[-1], len(index), len(index.word_ids))
+
+        temp_name = "%s.%d.tmp" % (file_name, os.getpid())
+        with open(temp_name, "wb") as compiled_file:
+            compiled_file.write(header)
+            for name, (offset, typecode, count) in sorted(sections.items(), key=lambda item: item[1][0]):
+                compiled_file.write(bytes(offset - compiled_file.tell()))
+                compiled_file.write(bytes(arrays[name]))
+        os.replace(temp_name, file_name)
+
+    @staticmethod
+    def open(file_name, source_stat = None):
+        """
+        Memory-map a compiled dictionary file; returns None if the file is missing, is from a different format
+        version or byte order, or (if source_stat is given) was compiled from a different version of the source file.
+        """
+        try:
+            with open(file_name, "rb") as compiled_file:
+                data = mmap.mmap(compiled_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        if len(data) < CompiledWords.HEADER.size:
+            return None
+
+        magic, version, little_endian, source_size, source_mtime, num_words, blob_size, num_nodes, num_trie_words = \
+                CompiledWords.HEADER.unpack_from(data)
+        if magic != CompiledWords.MAGIC or version != CompiledWords.VERSION or \
+                bool(little_endian) != (sys.byteorder == "little"):
+            return None
+        if source_stat is not None and (source_size, source_mtime) != (source_stat.st_size, source_stat.st_mtime_ns):
+            return None
+
+        return CompiledWords(data, CompiledWords._sections(num_words, blob_size, num_nodes, num_trie_words),
+                file_name)
+
+    @staticmethod
+    def _reopen(file_name):
+        """
+        Re-map a compiled dictionary file when unpickling; raises ValueError if it can no longer be opened.
+        """
+        words = CompiledWords.open(file_name)
+        if words is None:
+            raise ValueError("Compiled dictionary '%s' is missing or invalid" % file_name)
+        return words
+
+    def __reduce__(self):
+        # Memory maps can't be pickled, so other processes re-map the file instead.
+        return (CompiledWords._reopen, (self.file_name,))
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _word_bytes(self, index):
+        return self._data[self._blob_start + self._offsets[index]:self._blob_start + self._offsets[index + 1]]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("Word index out of range")
+
+        return self._word_bytes(index).decode("utf-8")
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._word_bytes(index).decode("utf-8")
+
+    def __contains__(self, word):
+        if not isinstance(word, str):
+            return False
+
+        key = word.encode("utf-8")
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._word_bytes(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low < len(self) and self._word_bytes(low) == key
+
+    def signature_trie(self):
+        """
+        Return the signature index stored in the compiled file.
+        """
+        return SignatureIndex(self, self._section("letters"), self._section("heights"),
+                self._section("child_starts"), self._section("child_counts"), self._section("word_starts"),
+                self._section("word_ids"))
+
+    def letter_matrix(self):
+        """
+        Return a letter matrix built from the letter counts stored in the compiled file (requires NumPy).
+        """
+        if np is None:
+            raise ImportError("NumPy is required to build a letter matrix")
+
+        counts = np.frombuffer(self._section("counts"), dtype=np.uint8).reshape(len(self), len(LETTERS))
+        lengths = np.frombuffer(self._section("lengths"), dtype=np.uint8)
+        rows = np.flatnonzero(counts.sum(axis=1) == lengths)
+
+        return LetterMatrix([self[int(row)] for row in rows], counts[rows])
+
+
 class LetterGenerator(object):
     """
     Class for generating letters given some distribution; for now, this distribution is independent of the current
     letters on the board.
+
+    Each generator has its own random number generator, seeded from the given seed (or from the global random module
+    if no seed is given), so two generators with the same seed produce exactly the same stream of letters. Letters are
+    drawn from the random number generator in bulk, <buffer_size> at a time. Other random decisions (choice() and
+    fork()) use a second random number generator derived from the same seed, so they don't disturb the letters.
     """
-    def __init__(self):
+
+    # Mixed into the seed of the random number generator used by choice() and fork().
+    CHOICE_SEED_MASK = 0x9E3779B97F4A7C15
+
+    def __init__(self, seed = None, buffer_size = 256):
         # Letter distribution uses the Scrabble distribution for now.
         self.letter_dist = [('A', 9), ('B', 2), ('C', 2), ('D', 4), ('E', 12), ('F', 2), ('G', 3), ('H', 2),
                 ('I', 9), ('J', 1), ('K', 1), ('L', 4), ('M', 2), ('N', 6), ('O', 8), ('P', 2), ('Q', 1),
@@ -67,28 +528,56 @@ class LetterGenerator(object):
         for letter, weight in self.letter_dist:
             self.letters_dup += [letter] * weight
 
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.buffer_size = buffer_size
+        self.rng = random.Random(self.seed)
+        self.choice_rng = random.Random(self.seed ^ LetterGenerator.CHOICE_SEED_MASK)
+
+        # Letters which have been sampled but not handed out yet, and the number of letters handed out so far.
+        self._buffer = []
+        self._position = 0
+        self.drawn = 0
+
     def __call__(self):
         """
         Randomly sample a letter from the letter distribution.
         """
-        return random.choice(self.letters_dup)
+        if self._position == len(self._buffer):
+            # (Random.choices() would be faster, but needs Python 3.6.)
+            self._buffer = [self.rng.choice(self.letters_dup) for _ in range(self.buffer_size)]
+            self._position = 0
+
+        letter = self._buffer[self._position]
+        self._position += 1
+        self.drawn += 1
+        return letter
 
+    def letters(self, count):
+        """
+        Sample the given number of letters, returned as a list.
+        """
+        return [self() for _ in range(count)]
+
+    def choice(self, options):
+        """
+        Randomly choose one of the given options, using this generator's choice random number generator (so that other
+        random decisions in a game are reproducible along with the letters).
+        """
+        return self.choice_rng.choice(options)
+
+    def fork(self):
+        """
+        Return a new, independent generator whose seed is drawn from this one; forking a generator in the same state
+        always gives the same child.
+        """
+        return LetterGenerator(self.choice_rng.getrandbits(64), self.buffer_size)
 
-# Constraints for valid positions in the board; each Y value has a starting X and ending X (both inclusive).
-BOARD_CONSTRAINTS = {
-    0: (0, 1),
-    1: (0, 3),
-    2: (0, 5),
-    3: (0, 6),
-    4: (0, 6),
-    5: (0, 6),
-    6: (1, 6),
-    7: (3, 6),
-    8: (5, 6)
-}
+    def replay(self):
+        """
+        Return a new generator which replays this generator's letters, choices and forks from the beginning.
+        """
+        return LetterGenerator(self.seed, self.buffer_size)
 
-# Offsets to obtain the adjacent tiles for a given tile.
-ADJACENT_OFFSETS = [(-1, 0), (1, 0), (0, -1), (0, 1), (1, 1), (-1, -1)]
 
 # Starting positions of the red/blue capitals.
 RED_START_POS = (1, 1)
@@ -102,38 +591,74 @@ BLUE = "BLUE"
 EMPTY = "EMPTY"
 LETTER_PREFIX="LETTER_"
 
+# Tile kinds in the packed board encoding (see Board.to_bytes()), where each cell is a byte holding the tile kind in
+# its top 3 bits and, for letter tiles, the index of the letter in LETTERS in its low 5 bits.
+CELL_EMPTY = 0
+CELL_RED = 1
+CELL_RED_CAPITAL = 2
+CELL_BLUE = 3
+CELL_BLUE_CAPITAL = 4
+CELL_LETTER = 5
+
+# The string form of each valid position, for parsing positions without a regex.
+_POSITION_STRINGS = { repr(pos): pos for pos in POSITIONS }
+
+# Tile type -> cell byte, and cell byte -> tile type (or None, for bytes which aren't valid cells).
+_TILE_CELLS = { EMPTY: CELL_EMPTY << 5, RED: CELL_RED << 5, RED_CAPITAL: CELL_RED_CAPITAL << 5, BLUE: CELL_BLUE << 5,
+        BLUE_CAPITAL: CELL_BLUE_CAPITAL << 5 }
+_TILE_CELLS.update({ LETTER_PREFIX + letter: CELL_LETTER << 5 | code for code, letter in enumerate(LETTERS) })
+_CELL_TILES = [None] * 256
+for _tile_type, _cell in _TILE_CELLS.items():
+    _CELL_TILES[_cell] = _tile_type
+del _tile_type, _cell
+
+def boards_array(encoded_boards):
+    """
+    Decode many packed boards (see Board.to_bytes()) at once into an (n_boards, NUM_POSITIONS) NumPy uint8 array of
+    cells; the tile kinds are then (cells >> 5) and the letter indices (cells & 31).
+    """
+    if np is None:
+        raise ImportError("NumPy is required for decoding boards into arrays")
+
+    cells = np.frombuffer(b"".join(encoded_boards), dtype=np.uint8)
+    if len(cells) % len(POSITIONS) != 0:
+        raise ValueError("Packed boards must be %d bytes each" % len(POSITIONS))
+
+    return cells.reshape(-1, len(POSITIONS))
+
+def boards_letter_counts(cells):
+    """
+    Return the (n_boards, 26) uint8 array of letter counts of an array of cells from boards_array(), in the form
+    expected by Dictionary.feasible_mask_batch().
+    """
+    is_letter = (cells >> 5) == CELL_LETTER
+    rows, _ = np.nonzero(is_letter)
+    counts = np.zeros((cells.shape[0], len(LETTERS)), dtype=np.uint8)
+    np.add.at(counts, (rows, cells[is_letter] & 31), 1)
+    return counts
+
 def valid_position(pos):
     """
     Return True if the given position is valid and inside the grid, and false otherwise.
     """
-    x_constraint = BOARD_CONSTRAINTS[pos[1]] if pos[1] in BOARD_CONSTRAINTS else (1, 0)
-    return pos[0] >= x_constraint[0] and pos[0] <= x_constraint[1]
+    return pos in VALID_POSITIONS
 
-# TODO: Precompute this, no point in remaking it every time.
 def valid_positions():
     """
-    Return a list of all valid positions on the board.
+    Return all valid positions on the board, as a tuple in canonical order.
     """
-    result = []
-    for y, x_constraint in BOARD_CONSTRAINTS.items():
-        x_min, x_max = x_constraint
-        for x in range(x_min, x_max + 1):
-            result.append((x, y))
-
-    return result
+    return POSITIONS
 
 def adjacent_positions(pos):
     """
-    Return a list of adjacent position tuples to the given position; only returns
+    Return a tuple of adjacent position tuples to the given position; only returns
     positions that are in bounds of the grid.
     """
-    result = []
-    for offset_x, offset_y in ADJACENT_OFFSETS:
-        offset_pos = (pos[0] + offset_x, pos[1] + offset_y)
-        if valid_position(offset_pos):
-            result.append(offset_pos)
+    neighbors = NEIGHBORS.get(pos)
+    if neighbors is None:
+        return tuple(compute_adjacent(pos))
 
-    return result
+    return neighbors
 
 def enemy_color(color):
     """
@@ -141,6 +666,30 @@ def enemy_color(color):
     """
     return RED if color == BLUE else BLUE
 
+def _zobrist_keys(name):
+    """
+    Return a tuple of random 64-bit Zobrist keys (one per position index) for the given tile type or letter name; keys
+    are seeded from the name, so they are the same in every process.
+    """
+    rng = random.Random("zobrist:" + name)
+    return tuple(rng.getrandbits(64) for _ in POSITIONS)
+
+# Zobrist keys for territory tiles (by tile type) and letter tiles (by letter, created as new letters are seen); the
+# hash of a board is the XOR of the keys of all of its non-empty tiles. The turn key is XORed in for blue's turn.
+_ZOBRIST_TERRITORY_KEYS = { tile_type: _zobrist_keys(tile_type) for tile_type in (RED, BLUE, RED_CAPITAL, BLUE_CAPITAL) }
+_ZOBRIST_LETTER_KEYS = {}
+_ZOBRIST_TURN_KEY = random.Random("zobrist:turn").getrandbits(64)
+
+def _zobrist_letter_keys(letter):
+    """
+    Return the Zobrist keys for tiles with the given letter.
+    """
+    keys = _ZOBRIST_LETTER_KEYS.get(letter)
+    if keys is None:
+        keys = _ZOBRIST_LETTER_KEYS[letter] = _zobrist_keys(LETTER_PREFIX + letter)
+
+    return keys
+
 class Board(object):
     """
     A game board of Capitals; contains methods for finding valid positions/adjacent positions, and tracks
@@ -148,20 +697,199 @@ class Board(object):
 
     Positions on the game board are in axial coordinates (the X direction is up and to the right, the Y coordinate
     is straight down); (0, 0) is at the upper-left hand corner of the board.
+
+    Internally, tiles are stored as bitmasks over the position indices: one mask of territory per color (including
+    the capital), a mask of which territory tiles are capitals, and a mask of letter tiles along with the letter at
+    each index. Empty tiles are those which are in none of the masks. A mask of the positions of each letter is kept
+    up to date on every tile change, so territory, capital and letter queries never have to scan the board.
+
+    Boards also keep an incrementally updated Zobrist hash, so they can be hashed and compared cheaply; boards compare
+    equal if they have the same tiles. Boards modified in place by apply_move() should not be used as keys while the
+    move is applied.
+
+    Derived views of a board (letter counts, letter positions, territories, capitals, the frontier and playable words)
+    are computed on first use and cached until the board changes, so the engine and agents can ask for them as often
+    as they like. The maps and lists returned for these views are shared between callers, and must not be modified.
     """
 
     def __init__(self, board = None):
         # Initialize the board with all empties.
-        self.board = { pos: EMPTY for pos in valid_positions() }
+        self._red = 0
+        self._blue = 0
+        self._capitals = 0
+        self._letter_mask = 0
+        self._letters = [None] * len(POSITIONS)
+        self._letter_masks = {}
+        self._zobrist = 0
+        self._derived = None
 
         # Copy over the tiles in the given board, throwing an error if any of them are out of bounds.
-        # TODO: Also check they're valid tile types!
         board = board or {}
         for pos, tile_type in board.items():
             if not valid_position(pos):
                 raise ValueError("Passed invalid position " + repr(pos) + " to board constructor")
             else:
-                self.board[pos] = tile_type
+                self._set_index(POSITION_INDEX[pos], tile_type)
+
+    def _copy(self):
+        """
+        Return a shallow copy of this board which can safely be modified.
+        """
+        result = Board.__new__(Board)
+        result._red = self._red
+        result._blue = self._blue
+        result._capitals = self._capitals
+        result._letter_mask = self._letter_mask
+        result._letters = list(self._letters)
+        result._letter_masks = dict(self._letter_masks)
+        result._zobrist = self._zobrist
+        result._derived = None
+        return result
+
+    def __getstate__(self):
+        # Derived views are cheap to recompute, and may refer to a whole dictionary.
+        state = dict(self.__dict__)
+        state["_derived"] = None
+        return state
+
+    def _view(self, key, compute):
+        """
+        Return the derived view of this board with the given key, computing it with compute() on first use. Views are
+        shared by every caller on this board, so public methods hand out copies of mutable views.
+        """
+        if self._derived is None:
+            self._derived = {}
+        elif key in self._derived:
+            return self._derived[key]
+
+        value = self._derived[key] = compute()
+        return value
+
+    def __eq__(self, other):
+        if not isinstance(other, Board):
+            return NotImplemented
+
+        return self._zobrist == other._zobrist and self._red == other._red and self._blue == other._blue and \
+                self._capitals == other._capitals and self._letters == other._letters
+
+    def __hash__(self):
+        return self._zobrist
+
+    def zobrist_hash(self):
+        """
+        Return the 64-bit Zobrist hash of this board.
+        """
+        return self._zobrist
+
+    def _put_letter(self, index, letter):
+        """
+        Set the letter at the given position index (or clear it, if letter is None), keeping the letter masks up to
+        date; does not touch the letter tile mask.
+        """
+        old_letter = self._letters[index]
+        if old_letter == letter:
+            return
+
+        self._derived = None
+        bit = 1 << index
+        if old_letter is not None:
+            self._zobrist ^= _zobrist_letter_keys(old_letter)[index]
+            mask = self._letter_masks[old_letter] & ~bit
+            if mask:
+                self._letter_masks[old_letter] = mask
+            else:
+                del self._letter_masks[old_letter]
+
+        if letter is not None:
+            self._zobrist ^= _zobrist_letter_keys(letter)[index]
+            self._letter_masks[letter] = self._letter_masks.get(letter, 0) | bit
+
+        self._letters[index] = letter
+
+    def _set_index(self, index, tile_type):
+        """
+        Set the tile at the given position index to the given type, in place.
+        """
+        self._derived = None
+        old_keys = _ZOBRIST_TERRITORY_KEYS.get(self._tile_at(index))
+        if old_keys is not None:
+            self._zobrist ^= old_keys[index]
+
+        bit = 1 << index
+        self._red &= ~bit
+        self._blue &= ~bit
+        self._capitals &= ~bit
+        self._letter_mask &= ~bit
+        self._put_letter(index, None)
+
+        if tile_type == RED or tile_type == RED_CAPITAL:
+            self._red |= bit
+        elif tile_type == BLUE or tile_type == BLUE_CAPITAL:
+            self._blue |= bit
+        elif tile_type.startswith(LETTER_PREFIX):
+            self._letter_mask |= bit
+            self._put_letter(index, tile_type[len(LETTER_PREFIX):])
+        elif tile_type != EMPTY:
+            raise ValueError("Invalid tile type " + repr(tile_type))
+
+        if tile_type == RED_CAPITAL or tile_type == BLUE_CAPITAL:
+            self._capitals |= bit
+
+        new_keys = _ZOBRIST_TERRITORY_KEYS.get(tile_type)
+        if new_keys is not None:
+            self._zobrist ^= new_keys[index]
+
+    def _tile_at(self, index):
+        """
+        Return the tile type at the given position index.
+        """
+        bit = 1 << index
+        if self._letter_mask & bit:
+            return LETTER_PREFIX + self._letters[index]
+        elif self._red & bit:
+            return RED_CAPITAL if self._capitals & bit else RED
+        elif self._blue & bit:
+            return BLUE_CAPITAL if self._capitals & bit else BLUE
+        else:
+            return EMPTY
+
+    def _territory_mask(self, color):
+        """
+        Return the mask of all territory tiles (including the capital) for the given color.
+        """
+        return self._red if color == RED else self._blue
+
+    def _empty_mask(self):
+        """
+        Return the mask of all empty tiles.
+        """
+        return ALL_MASK & ~(self._red | self._blue | self._letter_mask)
+
+    def _tile_mask(self, tile_type):
+        """
+        Return the mask of all tiles which have exactly the given tile type.
+        """
+        if tile_type == RED:
+            return self._red & ~self._capitals
+        elif tile_type == RED_CAPITAL:
+            return self._red & self._capitals
+        elif tile_type == BLUE:
+            return self._blue & ~self._capitals
+        elif tile_type == BLUE_CAPITAL:
+            return self._blue & self._capitals
+        elif tile_type == EMPTY:
+            return self._empty_mask()
+        elif tile_type.startswith(LETTER_PREFIX):
+            return self._letter_masks.get(tile_type[len(LETTER_PREFIX):], 0)
+        else:
+            return 0
+
+    @property
+    def board(self):
+        """
+        A map of every valid position -> the tile type at that position.
+        """
+        return { pos: self._tile_at(index) for index, pos in enumerate(POSITIONS) }
 
     @staticmethod
     def initial(lettergen):
@@ -172,10 +900,10 @@ class Board(object):
         board[RED_START_POS] = RED_CAPITAL
         board[BLUE_START_POS] = BLUE_CAPITAL
 
-        for adj in adjacent_positions(RED_START_POS):
+        for adj in NEIGHBORS[RED_START_POS]:
             board[adj] = LETTER_PREFIX + lettergen()
 
-        for adj in adjacent_positions(BLUE_START_POS):
+        for adj in NEIGHBORS[BLUE_START_POS]:
             board[adj] = LETTER_PREFIX + lettergen()
 
         return Board(board)
@@ -190,73 +918,149 @@ class Board(object):
         """
         board = {}
         for entry, value in json.items():
-            match = Board.POSITION_REGEX.match(entry)
-            if not match:
-                raise ValueError("Invalid board JSON map: %s" % repr(json))
-            else:
-                position = (int(match.group(1)), int(match.group(2)))
-                board[position] = value
+            board[Board.parse_position(entry)] = value
 
         return Board(board)
 
+    @staticmethod
+    def parse_position(string):
+        """
+        Parse a position from its string form "(x, y)" (as used in JSON board maps).
+        """
+        position = _POSITION_STRINGS.get(string)
+        if position is not None:
+            return position
+
+        match = Board.POSITION_REGEX.match(string)
+        if not match:
+            raise ValueError("Invalid position string %s" % string)
+
+        return (int(match.group(1)), int(match.group(2)))
+
     @staticmethod
     def to_json(board):
         """
         Create a json-ifiable map from a board.
         """
-        return { repr(pos): board.board[pos] for pos in filter(lambda k: board.board[k] != "EMPTY", board.board) }
+        occupied = board._red | board._blue | board._letter_mask
+        return { repr(POSITIONS[index]): board._tile_at(index)
+                for index in range(len(POSITIONS)) if occupied & (1 << index) }
+
+    @staticmethod
+    def from_bytes(data):
+        """
+        Create a board object from the packed form produced by Board.to_bytes().
+        """
+        if len(data) != len(POSITIONS):
+            raise ValueError("Packed boards must be %d bytes, got %d" % (len(POSITIONS), len(data)))
+
+        # Build the masks, letter index and hash directly, rather than setting one tile at a time.
+        board = Board()
+        for index, cell in enumerate(bytearray(data)):
+            if not cell:
+                continue
+
+            tile_type = _CELL_TILES[cell]
+            bit = 1 << index
+            if tile_type is None:
+                raise ValueError("Invalid packed cell %d at index %d" % (cell, index))
+            elif cell >> 5 == CELL_LETTER:
+                letter = LETTERS[cell & 31]
+                board._letter_mask |= bit
+                board._letters[index] = letter
+                board._letter_masks[letter] = board._letter_masks.get(letter, 0) | bit
+                board._zobrist ^= _zobrist_letter_keys(letter)[index]
+            else:
+                if cell >> 5 == CELL_RED or cell >> 5 == CELL_RED_CAPITAL:
+                    board._red |= bit
+                else:
+                    board._blue |= bit
+                if cell >> 5 == CELL_RED_CAPITAL or cell >> 5 == CELL_BLUE_CAPITAL:
+                    board._capitals |= bit
+                board._zobrist ^= _ZOBRIST_TERRITORY_KEYS[tile_type][index]
+
+        return board
+
+    @staticmethod
+    def to_bytes(board):
+        """
+        Pack a board into bytes, one per position in canonical order (see CELL_EMPTY and the other cell constants for
+        the layout of each byte). Only boards whose letters are all in LETTERS can be packed.
+        """
+        try:
+            return bytes(bytearray(_TILE_CELLS[board._tile_at(index)] for index in range(len(POSITIONS))))
+        except KeyError as e:
+            raise ValueError("Can't pack tile type %s" % e)
 
     def red_capital(self):
         """
         Return the position of the red capital, or None if there is no capital.
         """
-        return self.find_single(RED_CAPITAL)
+        return self.capital(RED)
 
     def blue_capital(self):
         """
         Return the position of the blue capital, or None if there is no capital.
         """
-        return self.find_single(BLUE_CAPITAL)
+        return self.capital(BLUE)
 
     def capital(self, color):
         """
         Returns the capital of the given color.
         """
-        if color == RED:
-            return self.red_capital()
-        else:
-            return self.blue_capital()
+        return self._view(("capital", color), lambda: self.find_single(color + "_CAPITAL"))
 
     def territory(self, color):
         """
         Returns all of the territory tiles for the given team color.
         """
-        return self.find_all_matching(lambda p, t: t == color or t == color + "_CAPITAL")
+        return list(self._view(("territory", color), lambda: mask_positions(self._territory_mask(color))))
+
+    def _frontier_mask(self, color):
+        """
+        Return the mask of all tiles adjacent to the territory of the given color (which includes some of the
+        territory itself).
+        """
+        return self._view(("frontier", color), lambda: neighbor_mask(self._territory_mask(color)))
+
+    def frontier(self, color):
+        """
+        Returns the letter tiles adjacent to the territory of the given color; every move which takes territory plays
+        at least one of them.
+        """
+        return list(self._view(("frontier_letters", color),
+                lambda: mask_positions(self._frontier_mask(color) & self._letter_mask)))
+
+    def territory_size(self, color):
+        """
+        Returns the number of territory tiles for the given team color.
+        """
+        return bin(self._territory_mask(color)).count("1")
 
     def find_single(self, tile_type):
         """
         Return the position of a tile which has the given tile type; no gauruntees are made about
         which specific tile are returned if the choice is ambiguous.
         """
-        for pos in valid_positions():
-            if self.get_tile(pos) == tile_type:
-                return pos
+        mask = self._tile_mask(tile_type)
+        if mask == 0:
+            return None
 
-        return None
+        return POSITIONS[(mask & -mask).bit_length() - 1]
 
     def find_all(self, tile_type):
         """
         Return the position of all tiles which have the given type.
         """
-        return self.find_all_matching(lambda p, t: t == tile_type)
+        return mask_positions(self._tile_mask(tile_type))
 
     def find_all_matching(self, predicate):
         """
         Return the position of all (pos, tile_type) pairs which return True when passed to the given predicate.
         """
         positions = []
-        for pos in valid_positions():
-            if predicate(pos, self.get_tile(pos)):
+        for index, pos in enumerate(POSITIONS):
+            if predicate(pos, self._tile_at(index)):
                 positions.append(pos)
 
         return positions
@@ -265,8 +1069,37 @@ class Board(object):
         """
         Return a map of positions -> letter at that position, for all of the letters on the board.
         """
-        letter_positions = self.find_all_matching(lambda p, t: t.startswith(LETTER_PREFIX))
-        return { pos: self.get_tile(pos)[len(LETTER_PREFIX):] for pos in letter_positions }
+        return dict(self._view("letters", lambda: { POSITIONS[index]: letter
+                for index, letter in enumerate(self._letters) if letter is not None }))
+
+    def letter_positions(self, letter):
+        """
+        Return the positions of all of the tiles with the given letter.
+        """
+        return mask_positions(self._letter_masks.get(letter, 0))
+
+    def letters_to_positions(self):
+        """
+        Return a map of letter -> list of positions with that letter, for all of the letters on the board.
+        """
+        positions = self._view("letters_to_positions", lambda: { letter: mask_positions(mask)
+                for letter, mask in self._letter_masks.items() })
+        return { letter: list(letter_positions) for letter, letter_positions in positions.items() }
+
+    def letter_counts(self):
+        """
+        Return a map of letter -> number of tiles with that letter, for all of the letters on the board.
+        """
+        return dict(self._view("letter_counts", lambda: { letter: bin(mask).count("1")
+                for letter, mask in self._letter_masks.items() }))
+
+    def playable_words(self, dictionary):
+        """
+        Return the list of words in the given dictionary which can be made from the letters on the board, in the
+        order Dictionary.playable_words() produces them.
+        """
+        return list(self._view(("playable_words", dictionary), lambda: list(dictionary.playable_words(
+                self.letter_counts()))))
 
     def floodfill(self, starts, predicate):
         """
@@ -276,17 +1109,18 @@ class Board(object):
         Returns a set of all of the visited positions in the flood-fill.
         """
         visited = set(starts)
-        queued = deque(starts)
+        queued = deque(POSITION_INDEX[pos] for pos in starts)
 
         while len(queued) > 0:
-            pos = queued.popleft()
-            for adj in adjacent_positions(pos):
+            index = queued.popleft()
+            for adj_index in NEIGHBOR_INDICES[index]:
+                adj = POSITIONS[adj_index]
                 if adj in visited:
                     continue
 
-                if predicate(adj, self.get_tile(adj)):
+                if predicate(adj, self._tile_at(adj_index)):
                     visited.add(adj)
-                    queued.append(adj)
+                    queued.append(adj_index)
 
         return visited
 
@@ -297,31 +1131,28 @@ class Board(object):
         if not valid_position(position):
             raise IndexError("Position " + repr(position) + " is not a valid board position")
 
-        new_board = dict(self.board)
-        new_board[position] = new_type
+        new_board = self._copy()
+        new_board._set_index(POSITION_INDEX[position], new_type)
 
-        return Board(new_board)
+        return new_board
 
     def get_tile(self, position):
         """
         Return the tile at the given position (if there is no tile there, empty is returned).
         """
-        if position not in self.board:
-            if valid_position(position):
-                return EMPTY
-            else:
-                raise IndexError("Position " + repr(position) + " is not a valid board position")
-        return self.board[position]
+        index = POSITION_INDEX.get(position)
+        if index is None:
+            raise IndexError("Position " + repr(position) + " is not a valid board position")
+        return self._tile_at(index)
 
     def get_letter(self, position):
         """
         Get the letter on the grid at the current position if it has one; otherwise, return None.
         """
-        tile = self.get_tile(position)
-        if tile.startswith(LETTER_PREFIX):
-            return tile[len(LETTER_PREFIX):]
-        else:
-            return None
+        index = POSITION_INDEX.get(position)
+        if index is None:
+            raise IndexError("Position " + repr(position) + " is not a valid board position")
+        return self._letters[index]
 
     def get_word(self, positions):
         """
@@ -337,63 +1168,275 @@ class Board(object):
 
         return word
 
-    def use_tiles(self, tiles, player, lettergen = LetterGenerator()):
+    def _check_tiles(self, tiles):
         """
-        Given a list of tiles and the player who selected those tiles:
-        - Finds all of the tiles connected to the players territory (either directly or via other selected tiles), and adds them to the players territory.
-        - If any of the connected tiles are adjacent to enemy territory, "captures" that territory by replacing it with
-          letter tiles.
-
-        Returns a tuple of (new board, capital_captured); if capital_captured is True, then this operation captured the
-        enemy capital.
+        Verify all played tiles are letter tiles, and in bounds.
         """
-        # Verify all played tiles are letter tiles, and in bounds.
         for tile in tiles:
             if not valid_position(tile):
                 raise ValueError("Tile " + repr(tile) + " is not a valid position on the board!")
             elif self.get_letter(tile) is None:
                 raise ValueError("Tile " + repr(tile) + " is type " + self.get_tile(tile) + ", not letter!")
 
-        # Compute some constants.
-        player_capital = (player + "_CAPITAL")
-        enemy = "RED" if player == "BLUE" else "BLUE"
-        enemy_capital = "RED_CAPITAL" if player == "BLUE" else "BLUE_CAPITAL"
+    def _connected_mask(self, tiles_mask, player):
+        """
+        Return the mask of the played tiles which are connected to the players territory, either directly or via
+        other played tiles.
+        """
+        # A single flood-fill through the played tiles, starting from every played tile on the border of the
+        # territory, finds all of them at once.
+        starts = self._frontier_mask(player) & tiles_mask
+        return flood_mask(starts, tiles_mask)
+
+    def connected_played_tiles(self, tiles, player):
+        """
+        Given a list of played tiles and the player who selected them, return the set of tiles which are connected to
+        the players territory (either directly or via other played tiles); these are the tiles which use_tiles() turns
+        into the players territory.
+        """
+        self._check_tiles(tiles)
+        return set(mask_positions(self._connected_mask(positions_mask(tiles), player)))
+
+    def _play(self, tiles, player, lettergen):
+        """
+        Play the given tiles for the given player in place, drawing replacement letters from the letter generator.
+        Returns a tuple of (played tiles set, tiles mask, captured mask, capital_captured), where the captured mask
+        contains the enemy/empty tiles which were turned into letters.
+        """
+        self._check_tiles(tiles)
 
-        # Flood-fill from each tile; if a tile is connected to the players territory, then this tile will
-        # capture new territory.
         tiles = set(tiles)
-        connected_tiles = set()
+        tiles_mask = positions_mask(tiles)
+        connected = self._connected_mask(tiles_mask, player)
+        enemy_territory = self._territory_mask(enemy_color(player))
+
+        # Connected tiles become player territory, and all enemy/empty tiles adjacent to them become letter tiles;
+        # disconnected tiles just become a new letter.
+        captured = neighbor_mask(connected) & (enemy_territory | self._empty_mask())
+        captured_capital = (captured & self._capitals) != 0
+        self._derived = None
+
+        # Update the hash for the territory changes; letter changes are hashed as the letters are placed.
+        player_keys = _ZOBRIST_TERRITORY_KEYS[player]
+        bits = connected
+        while bits:
+            low_bit = bits & -bits
+            self._zobrist ^= player_keys[low_bit.bit_length() - 1]
+            bits ^= low_bit
+
+        enemy = enemy_color(player)
+        bits = captured & enemy_territory
+        while bits:
+            low_bit = bits & -bits
+            enemy_keys = _ZOBRIST_TERRITORY_KEYS[enemy + "_CAPITAL" if low_bit & self._capitals else enemy]
+            self._zobrist ^= enemy_keys[low_bit.bit_length() - 1]
+            bits ^= low_bit
+
+        if player == RED:
+            self._red |= connected
+            self._blue &= ~captured
+        else:
+            self._blue |= connected
+            self._red &= ~captured
+        self._capitals &= ~captured
+        self._letter_mask = (self._letter_mask & ~connected) | captured
+
+        # Draw new letters in the same order as tiles are visited, so a given letter generator always produces the
+        # same board.
+        pending = captured
         for tile in tiles:
-            if tile in connected_tiles:
-                continue
+            index = POSITION_INDEX[tile]
+            if connected & (1 << index):
+                self._put_letter(index, None)
+                for adj in NEIGHBOR_INDICES[index]:
+                    if pending & (1 << adj):
+                        pending ^= 1 << adj
+                        self._put_letter(adj, lettergen())
+            else:
+                self._put_letter(index, lettergen())
 
-            flood_tiles = self.floodfill([tile], lambda p, t: t == player or t == (player + "_CAPITAL") or p in tiles)
-            is_connected = any(map(lambda k: self.get_tile(k) == player or self.get_tile(k) == (player + "_CAPITAL"), flood_tiles))
+        return tiles, tiles_mask, captured, captured_capital
 
-            if is_connected:
-                for tile in flood_tiles:
-                    if tile in tiles:
-                        connected_tiles.add(tile)
+    def use_tiles(self, tiles, player, lettergen = LetterGenerator()):
+        """
+        Given a list of tiles and the player who selected those tiles:
+        - Finds all of the tiles connected to the players territory (either directly or via other selected tiles), and adds them to the players territory.
+        - If any of the connected tiles are adjacent to enemy territory, "captures" that territory by replacing it with
+          letter tiles.
 
-        # Now that we have a set of connected tiles:
-        # - Connected tiles become player territory, and all tiles adjacent to them which were enemy territory become letter tiles.
-        # - Disconnected tiles just become a new letter.
-        result = self
-        captured_capital = False
-        for tile in tiles:
-            if tile in connected_tiles:
-                result = result.set_tile(tile, player)
-                for adj in adjacent_positions(tile):
-                    if result.get_tile(adj) == enemy or result.get_tile(adj) == EMPTY:
-                        result = result.set_tile(adj, LETTER_PREFIX + lettergen())
-                    elif result.get_tile(adj) == enemy_capital:
-                        result = result.set_tile(adj, LETTER_PREFIX + lettergen())
-                        captured_capital = True
-            else:
-                result = result.set_tile(tile, LETTER_PREFIX + lettergen())
+        Returns a tuple of (new board, capital_captured); if capital_captured is True, then this operation captured the
+        enemy capital.
+        """
+        result = self._copy()
+        captured_capital = result._play(tiles, player, lettergen)[3]
 
         return (result, captured_capital)
 
+    def evaluate_moves(self, moves, player, boards = False, lettergen = LetterGenerator()):
+        """
+        Computes the outcome of playing each of the given moves (lists of tiles) for the given player on this board,
+        returning a list of MoveOutcome objects in the same order. The players territory and its border are only
+        computed once for all of the moves, and resulting boards are only built (using the letter generator) if
+        boards is True.
+        """
+        territory = self._territory_mask(player)
+        enemy_territory = self._territory_mask(enemy_color(player))
+        frontier = self._frontier_mask(player)
+        capturable = enemy_territory | self._empty_mask()
+        territory_size = bin(territory).count("1")
+        enemy_territory_size = bin(enemy_territory).count("1")
+
+        outcomes = []
+        for tiles in moves:
+            try:
+                tiles_mask = positions_mask(tiles)
+            except KeyError:
+                tiles_mask = None
+            if tiles_mask is None or tiles_mask & ~self._letter_mask:
+                self._check_tiles(tiles)
+
+            connected = flood_mask(frontier & tiles_mask, tiles_mask)
+            captured = neighbor_mask(connected) & capturable
+            outcome = MoveOutcome(tiles, connected, captured, (captured & self._capitals) != 0,
+                    territory_size + bin(connected).count("1"),
+                    enemy_territory_size - bin(captured & enemy_territory).count("1"))
+            if boards:
+                outcome.board = self.use_tiles(tiles, player, lettergen)[0]
+
+            outcomes.append(outcome)
+
+        return outcomes
+
+    def apply_move(self, tiles, player, letters):
+        """
+        Plays the given tiles for the given player exactly like use_tiles(), but modifies this board in place instead
+        of creating a new one; replacement letters are taken in order from the given sequence of letters, so that
+        playing the same move with the same letters always gives the same board.
+
+        Returns a MoveRecord which can be passed to undo() to restore the board to how it was before the move.
+        """
+        letter_iter = iter(letters)
+        def lettergen():
+            letter = next(letter_iter, None)
+            if letter is None:
+                raise ValueError("Ran out of letters while playing tiles " + repr(tiles))
+            return letter
+
+        masks = (self._red, self._blue, self._capitals, self._letter_mask, self._zobrist)
+        old_letters = [(POSITION_INDEX[tile], self.get_letter(tile)) for tile in tiles if valid_position(tile)]
+        try:
+            tiles, tiles_mask, captured, captured_capital = self._play(tiles, player, lettergen)
+        except ValueError:
+            # Running out of letters can leave the move half-applied; clear any letters drawn for non-letter tiles.
+            self._restore(masks, old_letters, ALL_MASK & ~masks[3])
+            raise
+
+        letters_used = bin(captured | (tiles_mask & ~self._territory_mask(player))).count("1")
+        return MoveRecord(masks, old_letters, captured, captured_capital, letters_used)
+
+    def undo(self, record):
+        """
+        Undoes a move made by apply_move(), given the record it returned. Moves must be undone in the reverse order
+        that they were applied.
+        """
+        self._restore(record.masks, record.letters, record.captured)
+
+    def _restore(self, masks, old_letters, captured):
+        """
+        Restore the board masks and hash, the letters at the played tiles, and clear the letters drawn for captured
+        tiles.
+        """
+        self._red, self._blue, self._capitals, self._letter_mask, zobrist = masks
+        self._derived = None
+        for index, letter in old_letters:
+            self._put_letter(index, letter)
+        while captured:
+            low_bit = captured & -captured
+            self._put_letter(low_bit.bit_length() - 1, None)
+            captured ^= low_bit
+
+        self._zobrist = zobrist
+
+
+class MoveOutcome(object):
+    """
+    The outcome of playing a move on a board, as computed by Board.evaluate_moves().
+    """
+    def __init__(self, tiles, connected_mask, captured_mask, captured_capital, territory_size, enemy_territory_size):
+        # The played tiles.
+        self.tiles = tiles
+        self.connected_mask = connected_mask
+        self.captured_mask = captured_mask
+        # True if the move captures the enemy capital.
+        self.captured_capital = captured_capital
+        # Number of territory tiles the player and the enemy have after the move.
+        self.territory_size = territory_size
+        self.enemy_territory_size = enemy_territory_size
+        # The board after the move, if it was requested.
+        self.board = None
+
+    @property
+    def connected(self):
+        """
+        The set of played tiles which become the players territory.
+        """
+        return set(mask_positions(self.connected_mask))
+
+    @property
+    def captured(self):
+        """
+        The set of enemy/empty tiles next to the connected tiles which are turned into letters.
+        """
+        return set(mask_positions(self.captured_mask))
+
+
+class MoveRecord(object):
+    """
+    A record of a move which was applied in place to a board by Board.apply_move(), containing everything needed to
+    undo it.
+    """
+    def __init__(self, masks, letters, captured, captured_capital, letters_used):
+        # The board masks and hash from before the move.
+        self.masks = masks
+        # List of (position index, letter) for the played tiles, from before the move.
+        self.letters = letters
+        # Mask of the enemy/empty tiles which were captured and turned into letters.
+        self.captured = captured
+        # True if the move captured the enemy capital.
+        self.captured_capital = captured_capital
+        # Number of letters taken from the letter sequence.
+        self.letters_used = letters_used
+
+
+def _word_placements(word, letter_indices):
+    """
+    Generate every way of placing a word on the tiles of a board, given a map of letter -> sorted position indices of
+    the tiles with that letter, as lists of position indices in word order (in lexicographic order). The tiles used
+    for repeated letters are always increasing, so every set of tiles is produced once.
+    """
+    # For every letter of the word, the index in the word of the previous use of that letter (if any), and the number
+    # of later uses of it, which need tiles of their own.
+    previous = []
+    remaining = []
+    for i, letter in enumerate(word):
+        earlier = word.rfind(letter, 0, i)
+        previous.append(earlier if earlier >= 0 else None)
+        remaining.append(word.count(letter, i + 1))
+
+    placement = [0] * len(word)
+    def place(i):
+        if i == len(word):
+            yield list(placement)
+            return
+
+        indices = letter_indices[word[i]]
+        start = 0 if previous[i] is None else bisect.bisect_right(indices, placement[previous[i]])
+        for index in indices[start:len(indices) - remaining[i]]:
+            placement[i] = index
+            yield from place(i + 1)
+
+    return place(0)
+
 
 class State(object):
     """
@@ -403,7 +1446,9 @@ class State(object):
     def __init__(self, dictionary, board = Board(), lettergen = LetterGenerator(), turn = "RED", round = 1):
         """
         Create a new game state. The board should be a Board instance; the turn should be
-        "RED" for the red player, or "BLUE" for the blue player.
+        "RED" for the red player, or "BLUE" for the blue player. The letter generator supplies both new letters and
+        any other random choices in the game (such as where a captured capital respawns), so a seeded generator makes
+        the whole game reproducible.
         """
         self.dictionary = dictionary
         self.lettergen = lettergen
@@ -424,7 +1469,10 @@ class State(object):
         """
         Parse a state object from JSON.
         """
-        board = Board.from_json(json["board"])
+        if "cells" in json:
+            board = Board.from_bytes(base64.b64decode(json["cells"]))
+        else:
+            board = Board.from_json(json["board"])
         return State(dictionary, board, lettergen, json["turn"], int(json["round"]))
 
     @staticmethod
@@ -432,15 +1480,22 @@ class State(object):
         """
         Convert a state object to a JSON-friendly map.
         """
-        return { "board": Board.to_json(state.board), "turn": state.turn, "round": state.round }
+        return { "cells": base64.b64encode(Board.to_bytes(state.board)).decode("ascii"), "turn": state.turn,
+                "round": state.round }
+
+    def zobrist_hash(self):
+        """
+        Return the 64-bit Zobrist hash of this position (the board and whose turn it is).
+        """
+        return self.board.zobrist_hash() ^ (_ZOBRIST_TURN_KEY if self.turn == BLUE else 0)
 
     def winner(self):
         """
         Returns the winner (RED or BLUE) if a winner is apparent; otherwise, returns None.
         """
-        if len(self.board.find_all_matching(lambda p, t: t == RED or t == RED_CAPITAL)) == 0:
+        if self.board.territory_size(RED) == 0:
             return BLUE
-        elif len(self.board.find_all_matching(lambda p, t: t == BLUE or t == BLUE_CAPITAL)) == 0:
+        elif self.board.territory_size(BLUE) == 0:
             return RED
         else:
             return None
@@ -479,29 +1534,165 @@ class State(object):
             enemy = (RED if self.turn == BLUE else BLUE)
             enemy_spots = new_board.find_all(enemy)
             if len(enemy_spots) > 0:
-                position = random.choice(enemy_spots)
+                position = self.lettergen.choice(enemy_spots)
                 new_board = new_board.set_tile(position, enemy + "_CAPITAL")
 
         return self.next_turn(new_board, capital_captured)
 
+    def playable_words(self):
+        """
+        Return the list of dictionary words which can be made from the letters on the board; the list is computed once
+        per board, and shared with every caller.
+        """
+        return self.board.playable_words(self.dictionary)
+
+    def legal_moves(self, connected_only = False, dedupe = False, limit = None, min_length = 1,
+            longest_first = False):
+        """
+        Generates the legal moves of the player whose turn it is as (word, positions) pairs, lazily: for every word
+        the dictionary can make from the letters on the board (see Dictionary.playable_words(), which also takes
+        min_length and longest_first), every way of choosing tiles for its letters, in lexicographic order of the
+        positions. Tiles with the same letter are interchangeable within a word, so every set of tiles is produced
+        once per word, with lower positions given to earlier letters; the first move for a word takes the first free
+        tile for each of its letters.
+
+        If connected_only is True, only moves which connect at least one tile to the players territory are produced.
+        If dedupe is True, only the first move for each set of connected tiles is produced, since such moves take and
+        capture exactly the same tiles. At most limit moves are produced, if it is given.
+        """
+        board = self.board
+        frontier = board._frontier_mask(self.turn)
+        letter_indices = { letter: mask_indices(mask) for letter, mask in board._letter_masks.items() }
+        words = [word for word in self.playable_words() if len(word) >= min_length]
+        if longest_first:
+            words.sort(key=len, reverse=True)
+
+        seen = set()
+        produced = 0
+        for word in words:
+            if connected_only and not any(board._letter_masks[letter] & frontier for letter in set(word)):
+                continue
+
+            for placement in _word_placements(word, letter_indices):
+                tiles_mask = 0
+                for index in placement:
+                    tiles_mask |= 1 << index
+
+                connected = flood_mask(frontier & tiles_mask, tiles_mask)
+                if connected_only and not connected:
+                    continue
+                if dedupe:
+                    if connected in seen:
+                        continue
+                    seen.add(connected)
+
+                yield word, [POSITIONS[index] for index in placement]
+                produced += 1
+                if limit is not None and produced >= limit:
+                    return
+
+    def _replay_tiles(self, action):
+        """
+        Play the given action on a copy of the board without drawing any letters, returning the new board, the mask
+        of tiles which are left waiting for a new letter, and whether the enemy capital was captured.
+        """
+        board = self.board._copy()
+        _, tiles_mask, captured, capital_captured = board._play(action, self.turn, lambda: None)
+        return board, (tiles_mask & ~board._territory_mask(self.turn)) | captured, capital_captured
+
+    def replay(self, action, letters = "", respawn = None):
+        """
+        Redo a turn recorded by turn_delta(), returning the new state: plays the action (or skips the turn, if the
+        action is None) with the given letters placed on the tiles which get new letters, in position index order,
+        and respawns the enemy capital at the given position index (if any). Unlike act(), the word is not checked.
+        """
+        if action is None:
+            return self.next_turn(self.board, False)
+
+        board, pending, capital_captured = self._replay_tiles(action)
+        if len(letters) != bin(pending).count("1"):
+            raise ValueError("Expected %d letters to replay, got %s" % (bin(pending).count("1"), repr(letters)))
+
+        for index, letter in zip(mask_indices(pending), letters):
+            board._put_letter(index, letter)
+
+        if respawn is not None:
+            board._set_index(respawn, enemy_color(self.turn) + "_CAPITAL")
+
+        return self.next_turn(board, capital_captured)
+
+    def turn_delta(self, action, new_state):
+        """
+        Return the (letters, respawn) which replay(action, letters, respawn) needs to reproduce new_state from this
+        state, as a string of the new letters in position index order and the position index of the respawned enemy
+        capital (or None); returns None if new_state can't be reproduced this way.
+        """
+        letters = ""
+        respawn = None
+        if action is not None:
+            try:
+                board, pending, _ = self._replay_tiles(action)
+            except ValueError:
+                return None
+
+            letters = "".join(new_state.board._letters[index] or "?" for index in mask_indices(pending))
+            enemy = enemy_color(self.turn)
+            if board.capital(enemy) is None and new_state.board.capital(enemy) is not None:
+                respawn = POSITION_INDEX[new_state.board.capital(enemy)]
+
+        try:
+            replayed = self.replay(action, letters, respawn)
+        except ValueError:
+            return None
+
+        if replayed.board != new_state.board or (replayed.turn, replayed.round) != (new_state.turn, new_state.round):
+            return None
+
+        return letters, respawn
+
 
 class GameLog(object):
     """
     A mutable log of an entire game, consisting of a series of states and actions.
-    Also contains some extra metadata about the competitors in the game.
+    Also contains some extra metadata about the competitors in the game, and optionally a map of metrics for each turn
+    (such as how long the agent took to act; see runner.run_game()), or None for turns without metrics.
+
+    If window is not None, only the latest window states are kept in memory (the log is then usually also being
+    streamed to a file by a GameLogWriter); states[0] is then the state before action number first_state.
     """
-    def __init__(self, states, actions, red_name, blue_name):
+    def __init__(self, states, actions, red_name, blue_name, metrics = None, window = None, first_state = 0):
         self.states = states
         self.actions = actions
         self.red_name = red_name
         self.blue_name = blue_name
+        self.metrics = metrics if metrics is not None else [None] * len(actions)
+        self.window = window
+        self.first_state = first_state
 
     @staticmethod
-    def initial(initial_state, red_name, blue_name):
+    def initial(initial_state, red_name, blue_name, window = None):
         """
         Create an "initial" game log which starts with only a single initial state.
         """
-        return GameLog([initial_state], [], red_name, blue_name)
+        return GameLog([initial_state], [], red_name, blue_name, window=window)
+
+    @staticmethod
+    def action_to_json(action):
+        """
+        Convert an action (a list of positions, or None) to a JSON-friendly list of position indices.
+        """
+        return None if action is None else [POSITION_INDEX[pos] for pos in action]
+
+    @staticmethod
+    def action_from_json(json):
+        """
+        Parse an action from the form produced by GameLog.action_to_json().
+        """
+        if json is None:
+            return None
+
+        # Older logs store positions as "(x, y)" strings rather than indices.
+        return [POSITIONS[entry] if isinstance(entry, int) else Board.parse_position(entry) for entry in json]
 
     @staticmethod
     def from_json(json, dictionary, lettergen):
@@ -509,32 +1700,50 @@ class GameLog(object):
         Load a game log from JSON.
         """
         states = [State.from_json(state, dictionary, lettergen) for state in json["states"]]
+        actions = [GameLog.action_from_json(action) for action in json["actions"]]
+        return GameLog(states, actions, json["red"], json["blue"], json.get("metrics"),
+                first_state=json.get("first_state", 0))
 
-        actions = []
-        for action in json["actions"]:
-            if action is None:
-                actions.append(action)
-                continue
+    @staticmethod
+    def from_file(file_name, dictionary, lettergen):
+        """
+        Load a game log directly from a log file, in either the JSON format written by GameLog.to_file() or the
+        JSON-lines formats (full or compact) written by GameLogWriter.
+        """
+        with open(file_name, "r") as logfile:
+            try:
+                header = json.loads(logfile.readline())
+            except ValueError:
+                header = None
 
-            result = []
-            for string in action:
-                match = Board.POSITION_REGEX.match(string)
-                if not match:
-                    raise ValueError("Invalid position string %s" % string)
+            if not isinstance(header, dict) or header.get("type") != "header":
+                logfile.seek(0)
+                return GameLog.from_json(json.load(logfile), dictionary, lettergen)
 
-                result.append((int(match.group(1)), int(match.group(2))))
+        with GameLogReader(file_name, dictionary, lettergen) as reader:
+            if reader.compact:
+                # Compact logs only parse their records up front; states are replayed when they're asked for.
+                records = list(reader.records())
+                return GameLog(ReplayedStates(reader.initial_state, records), [_compact_action(record)
+                        for record in records], reader.red_name, reader.blue_name,
+                        [record.get("m") for record in records])
 
-            actions.append(result)
+            log = GameLog.initial(reader.initial_state, reader.red_name, reader.blue_name)
+            for action, state, metrics in reader:
+                log.add_turn(action, state, metrics)
 
-        return GameLog(states, actions, json["red"], json["blue"])
+        return log
 
     @staticmethod
-    def from_file(file_name, dictionary, lettergen):
+    def open(file_name, dictionary, lettergen):
         """
-        Load a game log directly from a log file.
+        Open a game log file for random access without loading it all: JSON-lines logs are opened as an
+        IndexedGameLog, which only decodes turns when they're accessed, while JSON logs are loaded in full.
         """
-        with open(file_name, "r") as logfile:
-            return GameLog.from_json(json.load(logfile), dictionary, lettergen)
+        try:
+            return IndexedGameLog(file_name, dictionary, lettergen)
+        except ValueError:
+            return GameLog.from_file(file_name, dictionary, lettergen)
 
     @staticmethod
     def to_json(log):
@@ -543,33 +1752,43 @@ class GameLog(object):
         """
         return {
             "states": [State.to_json(state) for state in log.states],
-            "actions": [(None if action is None else [repr(pos) for pos in action]) for action in log.actions],
+            "actions": [GameLog.action_to_json(action) for action in log.actions],
             "red": log.red_name,
-            "blue": log.blue_name
+            "blue": log.blue_name,
+            "metrics": log.metrics,
+            "first_state": log.first_state
         }
 
     @staticmethod
     def to_file(log, file_name):
         """
-        Write a game log directly to a log file.
+        Write a game log directly to a log file. Logs which have dropped states (see window) can't be written, since
+        the file would be missing the start of the game; stream them with GameLogWriter instead.
         """
+        if log.first_state > 0:
+            raise ValueError("Can't write a game log which has dropped its first %d states" % log.first_state)
+
         with open(file_name, "w") as logfile:
             json.dump(GameLog.to_json(log), logfile, sort_keys=True, indent=4)
 
-    def add_turn(self, action, new_state):
+    def add_turn(self, action, new_state, metrics = None):
         """
-        Add the given turn to the log.
+        Add the given turn to the log, along with its metrics (if any).
         """
         self.actions.append(action)
         self.states.append(new_state)
+        self.metrics.append(metrics)
+        if self.window is not None and len(self.states) > self.window:
+            del self.states[0]
+            self.first_state += 1
 
-    def act(self, action):
+    def act(self, action, metrics = None):
         """
         Acts on the latest state in the log, returning the same output that the state.act() function returns;
-        appends the action and state to the game log.
+        appends the action, state and metrics (if any) to the game log.
         """
         state = self.states[-1].act(action)
-        self.add_turn(action, state)
+        self.add_turn(action, state, metrics)
         return state
 
     def winner(self):
@@ -600,6 +1819,422 @@ class GameLog(object):
         return len(self.actions)
 
 
+class GameLogWriter(object):
+    """
+    Writes a game log as it is played, in a JSON-lines format: a header record with the competitor names, the game
+    settings and the initial state, then one record per turn appended as soon as the turn is played, and finally an
+    end record with the winner. Every record is flushed as it is written, so a crash loses at most the turn in progress.
+    Use GameLogReader (or GameLog.from_file()) to read the log back.
+
+    Turn records come in two formats. Full records hold the action, the resulting state and the turn's metrics. Compact
+    records (the default) only hold the action as position indices ("a"), the letters drawn during the turn ("l") and
+    the position index of a respawned capital ("c"), as computed by State.turn_delta(), along with the metrics ("m");
+    states are rebuilt by replaying turns. Every keyframe_interval turns (and for any turn which can't be replayed),
+    a compact record also holds the whole board, packed by Board.to_bytes() and base64-encoded ("b"), with the turn
+    ("t") and round ("r"), so that a state can be rebuilt without replaying the game from the start.
+    """
+    VERSION = 1
+
+    def __init__(self, file_name, initial_state, red_name, blue_name, settings = None, compact = True,
+            keyframe_interval = 32):
+        self.file = open(file_name, "w")
+        self.compact = compact
+        self.keyframe_interval = keyframe_interval
+        self.state = initial_state
+        self.turns = 0
+        self._write({ "type": "header", "version": GameLogWriter.VERSION, "format": "compact" if compact else "full",
+                "red": red_name, "blue": blue_name, "settings": settings or {}, "state": State.to_json(initial_state) })
+
+    @staticmethod
+    def write(log, file_name, settings = None, compact = True):
+        """
+        Write a whole game log to a JSON-lines log file (for example, to convert a log to the compact format).
+        """
+        with GameLogWriter(file_name, log.states[0], log.red_name, log.blue_name, settings, compact) as writer:
+            for action, state, metrics in zip(log.actions, log.states[1:], log.metrics):
+                writer.add_turn(action, state, metrics)
+            writer.close(log.winner())
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, sort_keys=True, separators=(",", ":") if self.compact else None))
+        self.file.write("\n")
+        self.file.flush()
+
+    def add_turn(self, action, new_state, metrics = None):
+        """
+        Append the given turn to the log file.
+        """
+        self.turns += 1
+        if not self.compact:
+            self._write({ "type": "turn", "action": GameLog.action_to_json(action), "state": State.to_json(new_state),
+                    "metrics": metrics })
+            return
+
+        record = { "a": None if action is None else [POSITION_INDEX[pos] for pos in action] }
+        delta = self.state.turn_delta(action, new_state)
+        if delta is not None:
+            letters, respawn = delta
+            if letters:
+                record["l"] = letters
+            if respawn is not None:
+                record["c"] = respawn
+        if delta is None or self.turns % self.keyframe_interval == 0:
+            record.update({ "b": base64.b64encode(Board.to_bytes(new_state.board)).decode("ascii"), "t": new_state.turn,
+                    "r": new_state.round })
+        if metrics is not None:
+            # Times are kept to the microsecond, which is plenty for metrics and much shorter to write.
+            record["m"] = { key: round(value, 6) if isinstance(value, float) else value
+                    for key, value in metrics.items() }
+
+        self._write(record)
+        self.state = new_state
+
+    def close(self, winner = None):
+        """
+        Write the end record with the given winner (if any), and close the log file.
+        """
+        if not self.file.closed:
+            self._write({ "type": "end", "winner": winner })
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.file.close()
+
+
+def _compact_action(record):
+    """
+    Return the action of a compact game log turn record.
+    """
+    return None if record["a"] is None else [POSITIONS[index] for index in record["a"]]
+
+def _replay_record(state, record):
+    """
+    Return the state after the given compact game log turn record, given the state before it.
+    """
+    if "b" in record:
+        board = Board.from_bytes(base64.b64decode(record["b"]))
+        return State(state.dictionary, board, state.lettergen, record["t"], record["r"])
+
+    return state.replay(_compact_action(record), record.get("l", ""), record.get("c"))
+
+
+class GameLogReader(object):
+    """
+    Reads a JSON-lines game log written by GameLogWriter lazily: the header is read on creation, and iterating over
+    the reader yields (action, state, metrics) for each turn, parsing (or replaying) one record at a time. Logs cut
+    short by a crash can still be read up to their last complete turn.
+    """
+
+    def __init__(self, file_name, dictionary, lettergen):
+        self.file = open(file_name, "r")
+        self.dictionary = dictionary
+        self.lettergen = lettergen
+        self.winner = None
+
+        header = json.loads(self.file.readline())
+        if not isinstance(header, dict) or header.get("type") != "header":
+            self.file.close()
+            raise ValueError("Not a streamed game log: %s" % file_name)
+
+        self.red_name = header["red"]
+        self.blue_name = header["blue"]
+        self.settings = header["settings"]
+        self.compact = header.get("format") == "compact"
+        self.initial_state = State.from_json(header["state"], dictionary, lettergen)
+
+    def records(self):
+        """
+        Generate the raw turn records of the log.
+        """
+        for line in self.file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A partially written last record, from a game which crashed mid-turn.
+                break
+
+            if record.get("type") == "end":
+                self.winner = record["winner"]
+            elif record.get("type") == "turn" or "a" in record:
+                yield record
+
+    def __iter__(self):
+        state = self.initial_state
+        for record in self.records():
+            if self.compact:
+                state = _replay_record(state, record)
+                yield _compact_action(record), state, record.get("m")
+            else:
+                yield (GameLog.action_from_json(record["action"]),
+                        State.from_json(record["state"], self.dictionary, self.lettergen), record["metrics"])
+
+    def close(self):
+        """
+        Close the log file.
+        """
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.file.close()
+
+
+class ReplayedStates(object):
+    """
+    The states of a compact game log, which behaves like a read-only list of states but only rebuilds a state when it
+    is asked for: by replaying turns from the closest keyframe or previously rebuilt state before it.
+    """
+
+    def __init__(self, initial_state, records):
+        self.initial_state = initial_state
+        self.records = records
+        self.keyframes = [index + 1 for index, record in enumerate(records) if "b" in record]
+        self._last = (0, initial_state)
+
+    def __len__(self):
+        return len(self.records) + 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("State index out of range")
+
+        # Start from the latest of the last rebuilt state, the closest keyframe and the initial state before index.
+        start, state = self._last if self._last[0] <= index else (0, self.initial_state)
+        keyframe = bisect.bisect_right(self.keyframes, index) - 1
+        if keyframe >= 0 and self.keyframes[keyframe] > start:
+            start = self.keyframes[keyframe]
+            state = _replay_record(state, self.records[start - 1])
+
+        while start < index:
+            state = _replay_record(state, self.records[start])
+            start += 1
+
+        self._last = (index, state)
+        return state
+
+    def __iter__(self):
+        state = self.initial_state
+        yield state
+        for record in self.records:
+            state = _replay_record(state, record)
+            yield state
+
+
+class LazySequence(object):
+    """
+    A read-only sequence of the given length whose items are computed by a function of their index when accessed.
+    """
+
+    def __init__(self, length, get):
+        self.length = length
+        self.get = get
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.get(i) for i in range(*index.indices(self.length))]
+
+        if index < 0:
+            index += self.length
+        if index < 0 or index >= self.length:
+            raise IndexError("Index out of range")
+
+        return self.get(index)
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield self.get(index)
+
+
+class IndexedGameLog(GameLog):
+    """
+    A read-only game log backed by a JSON-lines log file (see GameLogWriter). Opening the log only reads the header
+    and the offset of each turn record in the file; states, actions and metrics are decoded from their records when
+    they're accessed, and the most recently used states are kept in an LRU cache of cache_size states. States of
+    compact logs are replayed from the closest cached state or keyframe before them.
+    """
+
+    def __init__(self, file_name, dictionary, lettergen, cache_size = 64):
+        # Index the start of each complete line (a partially written last line is from a game which crashed mid-turn),
+        # keeping the turns which look like compact log keyframes as candidates. Only the header and the last line are
+        # parsed.
+        self.file_name = file_name
+        self._offsets = []
+        self._keyframes = []
+        header_line = None
+        last_line = None
+        offset = 0
+        with open(file_name, "rb") as logfile:
+            for line in logfile:
+                if not line.endswith(b"\n"):
+                    break
+                if header_line is None:
+                    header_line = line
+                elif b'"b":' in line:
+                    self._keyframes.append(len(self._offsets) - 1)
+                self._offsets.append(offset)
+                last_line = line
+                offset += len(line)
+
+        if header_line is None:
+            raise ValueError("Not a streamed game log: %s" % file_name)
+        header = json.loads(header_line.decode("utf-8"))
+        if not isinstance(header, dict) or header.get("type") != "header":
+            raise ValueError("Not a streamed game log: %s" % file_name)
+
+        # The header and the end record (if the game finished) aren't turns.
+        if len(self._offsets) > 1 and json.loads(last_line.decode("utf-8")).get("type") == "end":
+            self._offsets.pop()
+        del self._offsets[0]
+
+        self.compact = header.get("format") == "compact"
+        self.settings = header["settings"]
+        self.initial_state = State.from_json(header["state"], dictionary, lettergen)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+        turns = len(self._offsets)
+        GameLog.__init__(self, LazySequence(turns + 1, self._state), LazySequence(turns, self._action),
+                header["red"], header["blue"], LazySequence(turns, self._metrics))
+
+    def _record(self, index):
+        """
+        Read and parse the record of the turn with the given index.
+        """
+        with open(self.file_name, "rb") as logfile:
+            logfile.seek(self._offsets[index])
+            return json.loads(logfile.readline().decode("utf-8"))
+
+    def _action(self, index):
+        record = self._record(index)
+        return _compact_action(record) if self.compact else GameLog.action_from_json(record["action"])
+
+    def _metrics(self, index):
+        record = self._record(index)
+        return record.get("m") if self.compact else record["metrics"]
+
+    def _state(self, index):
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+
+        if index == 0:
+            state = self.initial_state
+        elif not self.compact:
+            state = State.from_json(self._record(index - 1)["state"], self.initial_state.dictionary,
+                    self.initial_state.lettergen)
+        else:
+            state = self._replay_to(index)
+
+        self._cache[index] = state
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return state
+
+    def _replay_to(self, index):
+        """
+        Rebuild the state with the given index of a compact log, replaying from the closest cached state or keyframe.
+        """
+        start, state = 0, self.initial_state
+        for cached_index, cached_state in self._cache.items():
+            if start < cached_index < index:
+                start, state = cached_index, cached_state
+
+        # Keyframe candidates are only checked once parsed, since the pattern could also appear in the metrics.
+        candidate = bisect.bisect_left(self._keyframes, index) - 1
+        while candidate >= 0 and self._keyframes[candidate] + 1 > start:
+            record = self._record(self._keyframes[candidate])
+            if "b" in record:
+                start, state = self._keyframes[candidate] + 1, _replay_record(state, record)
+                break
+            candidate -= 1
+
+        while start < index:
+            state = _replay_record(state, self._record(start))
+            start += 1
+
+        return state
+
+    def add_turn(self, action, new_state, metrics = None):
+        raise ValueError("Indexed game logs are read-only")
+
+
+class TranspositionTable(object):
+    """
+    A bounded cache of search results keyed by position hash (see State.zobrist_hash()), which can be shared between
+    searches and agents. Each entry stores the depth it was searched to; lookups only succeed if the entry was
+    searched at least as deep as required.
+
+    Replacement is depth-preferred: an entry is only overwritten by a result searched at least as deep, and when the
+    table is full the shallowest of the few least recently used entries is evicted.
+    """
+
+    # Number of least recently used entries considered when evicting.
+    EVICTION_WINDOW = 4
+
+    def __init__(self, capacity = 1 << 16):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, depth = 0):
+        """
+        Return the value stored for the given key if it was searched to at least the given depth; otherwise, returns
+        None.
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value, depth = 0):
+        """
+        Store the value for the given key, searched to the given depth.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            if depth < entry[0]:
+                return
+            self.entries.move_to_end(key)
+        elif len(self.entries) >= self.capacity:
+            oldest = list(islice(self.entries.items(), TranspositionTable.EVICTION_WINDOW))
+            victim = min(oldest, key=lambda item: item[1][0])[0]
+            del self.entries[victim]
+
+        self.entries[key] = (depth, value)
+
+    def clear(self):
+        """
+        Remove all entries from the table.
+        """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
 class Agent(object):
     """
     AI for a game of capitals; takes the current game state as input, returns the action it would like to take.
@@ -613,3 +2248,11 @@ class Agent(object):
         Examines the current state and returns a list of positions which it would like to play on.
         """
         pass
+
+    def stats(self):
+        """
+        Optionally returns a map of counter name -> number describing the work done by the last call to act() (such
+        as the number of words considered or boards scored), which the runner records in the game log; returns None
+        if the agent has nothing to report.
+        """
+        return None
@@ -0,0 +1,121 @@
+# Board geometry for Capitals: the shape of the board and lookup tables for positions and adjacency, all built once
+# at import time so the game engine and agents never have to recompute them.
+
+# Constraints for valid positions in the board; each Y value has a starting X and ending X (both inclusive).
+BOARD_CONSTRAINTS = {
+    0: (0, 1),
+    1: (0, 3),
+    2: (0, 5),
+    3: (0, 6),
+    4: (0, 6),
+    5: (0, 6),
+    6: (1, 6),
+    7: (3, 6),
+    8: (5, 6)
+}
+
+# Offsets to obtain the adjacent tiles for a given tile.
+ADJACENT_OFFSETS = [(-1, 0), (1, 0), (0, -1), (0, 1), (1, 1), (-1, -1)]
+
+def compute_positions():
+    """
+    Compute the list of all valid positions on the board from the board constraints, ordered by row and then column.
+    """
+    result = []
+    for y, x_constraint in sorted(BOARD_CONSTRAINTS.items()):
+        x_min, x_max = x_constraint
+        for x in range(x_min, x_max + 1):
+            result.append((x, y))
+
+    return result
+
+def compute_adjacent(pos):
+    """
+    Compute the list of in-bounds positions adjacent to the given position from the adjacency offsets.
+    """
+    result = []
+    for offset_x, offset_y in ADJACENT_OFFSETS:
+        offset_pos = (pos[0] + offset_x, pos[1] + offset_y)
+        x_constraint = BOARD_CONSTRAINTS.get(offset_pos[1], (1, 0))
+        if offset_pos[0] >= x_constraint[0] and offset_pos[0] <= x_constraint[1]:
+            result.append(offset_pos)
+
+    return result
+
+# Every valid position on the board, in canonical order; the index of a position in this tuple is its position index.
+POSITIONS = tuple(compute_positions())
+NUM_POSITIONS = len(POSITIONS)
+
+# Frozen set of valid positions, for fast membership checks.
+VALID_POSITIONS = frozenset(POSITIONS)
+
+# Maps from position -> position index (the inverse of POSITIONS).
+POSITION_INDEX = { pos: index for index, pos in enumerate(POSITIONS) }
+
+# Adjacent positions for every valid position, both as a map of position -> tuple of positions, and by index.
+NEIGHBORS = { pos: tuple(compute_adjacent(pos)) for pos in POSITIONS }
+NEIGHBOR_INDICES = tuple(tuple(POSITION_INDEX[adj] for adj in NEIGHBORS[pos]) for pos in POSITIONS)
+
+# Sets of tiles can be stored as integer bitmasks, where bit <index> is set if the tile is in the set. These are the
+# masks of the tiles adjacent to each position index, and the mask of every tile on the board.
+NEIGHBOR_MASKS = tuple(sum(1 << adj for adj in neighbors) for neighbors in NEIGHBOR_INDICES)
+ALL_MASK = (1 << NUM_POSITIONS) - 1
+
+def positions_mask(positions):
+    """
+    Return the mask containing all of the given positions.
+    """
+    mask = 0
+    for pos in positions:
+        mask |= 1 << POSITION_INDEX[pos]
+
+    return mask
+
+def mask_indices(mask):
+    """
+    Return the list of position indices whose bits are set in the given mask, in increasing order.
+    """
+    indices = []
+    while mask:
+        low_bit = mask & -mask
+        indices.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+
+    return indices
+
+def mask_positions(mask):
+    """
+    Return the list of positions whose bits are set in the given mask, in canonical order.
+    """
+    positions = []
+    while mask:
+        low_bit = mask & -mask
+        positions.append(POSITIONS[low_bit.bit_length() - 1])
+        mask ^= low_bit
+
+    return positions
+
+def neighbor_mask(mask):
+    """
+    Return the mask of all tiles adjacent to at least one tile in the given mask.
+    """
+    result = 0
+    while mask:
+        low_bit = mask & -mask
+        result |= NEIGHBOR_MASKS[low_bit.bit_length() - 1]
+        mask ^= low_bit
+
+    return result
+
+def flood_mask(seeds, allowed):
+    """
+    Flood-fill outwards from the tiles in the seed mask, only extending into tiles in the allowed mask; returns the
+    mask of all visited tiles (including the seeds).
+    """
+    visited = seeds
+    frontier = seeds
+    while frontier:
+        frontier = neighbor_mask(frontier) & allowed & ~visited
+        visited |= frontier
+
+    return visited
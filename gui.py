@@ -228,11 +228,11 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     logs = []
-    dictionary = capitals.Dictionary.from_file("dict.txt")
+    dictionary = capitals.Dictionary.from_compiled("dict.txt")
     lettergen = capitals.LetterGenerator()
 
     for logfile in args.logs:
-        logs.append(capitals.GameLog.from_file(logfile, dictionary, lettergen))
+        logs.append(capitals.GameLog.open(logfile, dictionary, lettergen))
         print("Loaded logfile '%s' (game had %d actions)" % (logfile, len(logs[-1])))
 
     app = App(logs)
@@ -2,14 +2,25 @@
 # Runner script for Capitals AIs - dynamically loads python modules which provide an Agent implementation,
 # and runs them against each other.
 
+import io
 import os
 import sys
+import time
+import json
+import math
+import random
 import signal
+import resource
+import threading
+import contextlib
+import multiprocessing
 import importlib
 import argparse
 import capitals
 
-from capitals import State, Dictionary, GameLog, Board
+from multiprocessing.pool import ThreadPool
+from capitals import State, Dictionary, GameLog, GameLogWriter, Board, LetterGenerator
+from geometry import POSITIONS, POSITION_INDEX
 
 class Competitor(object):
     """
@@ -63,108 +74,532 @@ def call_with_timeout(timeout, func, *args):
 
     return result
 
-def run_game(red_competitor, blue_competitor, dictionary, max_rounds=100, turn_timeout=10, verbose=True, logfile=None):
+def _peak_rss():
+    """
+    Return the peak resident set size of this process so far, in kilobytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def _start_usage():
+    """
+    Return a snapshot of the wall time, CPU time and peak RSS of this process, for _usage_since().
+    """
+    return (time.perf_counter(), time.process_time(), _peak_rss())
+
+def _usage_since(start):
+    """
+    Return a map of the wall time and CPU time (in seconds) and peak RSS growth (in kilobytes) since the given
+    _start_usage() snapshot.
+    """
+    wall_time, cpu_time, peak_rss = start
+    return { "wall_time": time.perf_counter() - wall_time, "cpu_time": time.process_time() - cpu_time,
+            "rss_delta": _peak_rss() - peak_rss }
+
+def _agent_worker_main(connection, competitor, dictionary, memory_limit):
+    """
+    Main loop of an agent worker process: creates agents for new games and answers their actions for states, until
+    told to close. The dictionary's indexes are built up front, so the first turn doesn't pay for them.
+    """
+    if memory_limit is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    dictionary.signature_trie()
+    agent = None
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+
+        if message[0] == "new_game":
+            agent = competitor.create_agent()
+        elif message[0] == "act":
+            _, board, turn, round, seed = message
+            state = State(dictionary, Board.from_bytes(board), LetterGenerator(seed), turn, round)
+            start = _start_usage()
+            try:
+                action = _encode_action(agent.act(state))
+                connection.send(("action", action, _usage_since(start), _agent_stats(agent)))
+            except Exception as e:
+                connection.send(("error", repr(e), _usage_since(start), _agent_stats(agent)))
+        elif message[0] == "close":
+            return
+
+def _agent_stats(agent):
+    """
+    Return the counters an agent reports for its last turn through the optional stats() method (see capitals.Agent),
+    as a plain map; returns None for agents which don't report any, or whose stats() fails.
+    """
+    stats = getattr(agent, "stats", None)
+    if stats is None:
+        return None
+
+    try:
+        result = stats()
+        return dict(result) if result is not None else None
+    except Exception:
+        return None
+
+def _encode_action(action):
+    """
+    Encode an action compactly as the bytes of its position indices; actions which aren't a list of valid positions
+    are sent as-is, so that the runner still reports them as invalid plays.
+    """
+    if action is None:
+        return None
+
+    try:
+        return bytes(POSITION_INDEX[tuple(pos)] for pos in action)
+    except (KeyError, TypeError, ValueError):
+        return list(action)
+
+def _decode_action(encoded):
+    """
+    Decode an action encoded by _encode_action().
+    """
+    if isinstance(encoded, bytes):
+        return [POSITIONS[index] for index in encoded]
+
+    return encoded
+
+class AgentWorker(object):
+    """
+    A competitor's agent running in a long-lived child process, which keeps the agent, the dictionary and its indexes
+    warm between turns and games, and isolates the runner from whatever the agent does to its state or memory.
+
+    States and actions cross the pipe in a compact form (see Board.to_bytes()), and the worker measures the CPU time
+    and memory of each action (see usage) since they're spent in its process rather than the runner's, along with the
+    agent's stats() for the action. Deadlines are enforced by the parent
+    rather than with signals, so workers can be used from any thread: a worker which doesn't answer in time is killed
+    and restarted, and its agent starts over with a fresh instance.
+    """
+
+    def __init__(self, competitor, dictionary, memory_limit=None):
+        self.competitor = competitor
+        self.dictionary = dictionary
+        self.memory_limit = memory_limit
+        self.process = None
+        self.connection = None
+        self.usage = None
+        self.last_stats = None
+
+    def start(self):
+        """
+        Start the worker process, if it isn't already running.
+        """
+        if self.process is not None:
+            return
+
+        parent_end, child_end = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_agent_worker_main,
+                args=(child_end, self.competitor, self.dictionary, self.memory_limit))
+        self.process.daemon = True
+        self.process.start()
+        child_end.close()
+        self.connection = parent_end
+
+    def stop(self):
+        """
+        Stop the worker process, killing it if it doesn't exit promptly.
+        """
+        if self.process is None:
+            return
+
+        try:
+            self.connection.send(("close",))
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+        self.connection.close()
+        self.process = None
+        self.connection = None
+
+    def restart(self):
+        """
+        Kill and restart the worker process, with a fresh agent.
+        """
+        if self.process is not None:
+            self.process.terminate()
+        self.stop()
+        self.new_game()
+
+    def new_game(self):
+        """
+        Create a new agent in the worker for a new game, starting (or restarting) the worker if needed.
+        """
+        if self.process is not None and not self.process.is_alive():
+            self.stop()
+        self.start()
+        self.connection.send(("new_game",))
+
+    def act(self, state, timeout):
+        """
+        Return the agent's action for the given state. Raises TimedOutException (after restarting the worker) if the
+        agent doesn't answer within timeout seconds; agents which raise an error or crash skip their turn. Afterwards,
+        usage is the worker's resource usage for the action (as returned by _usage_since()), or None if it is unknown.
+        The worker's copy of the state gets a letter generator with the same seed as the given state's.
+        """
+        self.usage = None
+        self.last_stats = None
+        self.connection.send(("act", Board.to_bytes(state.board), state.turn, state.round, state.lettergen.seed))
+        if not self.connection.poll(timeout):
+            self.restart()
+            raise TimedOutException()
+
+        try:
+            kind, payload, self.usage, self.last_stats = self.connection.recv()
+        except EOFError:
+            self.restart()
+            return None
+
+        return _decode_action(payload) if kind == "action" else None
+
+    def stats(self):
+        """
+        Return the stats the agent reported for its last action, if any.
+        """
+        return self.last_stats
+
+class SandboxedCompetitor(Competitor):
+    """
+    A competitor whose agents run in an AgentWorker process; the same worker is reused for every game it plays.
+    """
+
+    def __init__(self, competitor, dictionary, memory_limit=None):
+        Competitor.__init__(self, competitor.name, competitor.creators, competitor.agent_class)
+        self.worker = AgentWorker(competitor, dictionary, memory_limit)
+
+    def create_agent(self):
+        """
+        Start a new game in the worker, returning the worker to act as the agent.
+        """
+        self.worker.new_game()
+        return self.worker
+
+    def close(self):
+        """
+        Stop this competitor's worker process.
+        """
+        self.worker.stop()
+
+def run_game(red_competitor, blue_competitor, dictionary, max_rounds=100, turn_timeout=10, verbose=True, logfile=None,
+        seed=None, output=None, window=None):
     """
     Run a game of capitals between two competitors. Returns the winner (either RED for the red competitor or BLUE for
     the blue competitor), and the game log.
 
-    If logfile is specified, then the game log is dumped to the given log file as well.
+    If logfile is specified, then the game log is dumped to the given log file as well; log files ending in .jsonl are
+    streamed turn by turn as the game is played (see GameLogWriter). If window is not None, the returned game log only
+    keeps the latest window states in memory; a complete log can then only be written by streaming it, so window
+    requires either no logfile or a .jsonl one. If seed is specified, the letters and other random choices in the
+    game are generated from it, so the same seed always gives the same game for the same (deterministic) agents.
+    Verbose output is printed to output (by default, standard output).
+
+    Every turn's metrics are recorded in the game log: the wall time and CPU time (in seconds) and peak RSS growth (in
+    kilobytes) of the agent's act() call, whether it timed out, whether its action was an invalid play, the time the
+    engine took to apply the action, and any counters the agent reported for the turn through stats().
     """
-    game_log = GameLog.initial(State.initial(dictionary), red_competitor.name, blue_competitor.name)
+    if window is not None and logfile is not None and not logfile.endswith(".jsonl"):
+        raise ValueError("A windowed game can only be logged to a streamed .jsonl log, not %s" % logfile)
+
+    output = output or sys.stdout
+    lettergen = LetterGenerator(seed)
+    game_log = GameLog.initial(State.initial(dictionary, lettergen), red_competitor.name, blue_competitor.name,
+            window)
+
+    writer = None
+    if logfile is not None and logfile.endswith(".jsonl"):
+        settings = { "max_rounds": max_rounds, "turn_timeout": turn_timeout, "seed": seed }
+        writer = GameLogWriter(logfile, game_log.current_state(), red_competitor.name, blue_competitor.name, settings)
 
     red_agent = red_competitor.create_agent()
     blue_agent = blue_competitor.create_agent()
 
+    # Agents see states with letter generators of their own, so that any letters they draw while looking ahead don't
+    # change the letters of the game; every turn's generator is forked from a separate stream for the same seed.
+    agent_letters = LetterGenerator(seed).fork()
+
     turn_skips = 0
     while game_log.winner() is None and game_log.current_round() <= max_rounds:
-        # TODO: Pass deep copies of current state objects, to prevent people from meddling with them.
         state = game_log.current_state()
         competitor = red_competitor if state.turn == capitals.RED else blue_competitor
         agent = red_agent if state.turn == capitals.RED else blue_agent
 
+        # In-process agents get their own copy of the board, so a search which is interrupted partway through an
+        # apply_move()/undo() can't leave the game's board half-modified. Sandboxed agents only ever see a copy.
+        board = state.board if isinstance(agent, AgentWorker) else state.board._copy()
+        agent_state = State(state.dictionary, board, agent_letters.fork(), state.turn, state.round)
+
         action = None
         timeout = False
+        start = _start_usage()
         try:
-            action = call_with_timeout(turn_timeout, agent.act, state)
+            if isinstance(agent, AgentWorker):
+                action = agent.act(agent_state, turn_timeout)
+            else:
+                action = call_with_timeout(turn_timeout, agent.act, agent_state)
         except TimedOutException:
             timeout = True
 
-        # Skip agents who forgo their turn.
+        metrics = _usage_since(start)
+        metrics["turn"] = state.turn
+        metrics["timed_out"] = timeout
+        metrics["stats"] = _agent_stats(agent)
+        if isinstance(agent, AgentWorker):
+            # Sandboxed agents spend their CPU time and memory in the worker, not here.
+            metrics["cpu_time"] = agent.usage["cpu_time"] if agent.usage is not None else None
+            metrics["rss_delta"] = agent.usage["rss_delta"] if agent.usage is not None else None
+
+        # Apply the action, skipping the turns of agents who forgo their turn or make an invalid play.
+        engine_start = time.perf_counter()
+        invalid = False
         if action is None:
-            if verbose:
-                if not timeout:
-                    print("[%s (%s)] SKIPPED TURN" % (competitor.name, state.turn))
-                else:
-                    print("[%s (%s)] TIMED OUT" % (competitor.name, state.turn))
-
-            turn_skips += 1
-            game_log.add_turn(None, state.next_turn(state.board, False))
+            message = "TIMED OUT" if timeout else "SKIPPED TURN"
         else:
             try:
-                game_log.act(action)
-                turn_skips = 0
-                if verbose:
-                    print("[%s (%s)] PLAYING '%s'" % (competitor.name, state.turn, state.board.get_word(action)))
+                new_state = state.act(action)
+                message = "PLAYING '%s'" % state.board.get_word(action)
             except:
-                if verbose:
-                    print("[%s (%s)] INVALID PLAY at positions %s" % (competitor.name, state.turn, repr(action)))
-                turn_skips += 1
-                game_log.add_turn(None, state.next_turn(state.board, False))
+                message = "INVALID PLAY at positions %s" % repr(action)
+                action = None
+                invalid = True
+
+        if action is None:
+            turn_skips += 1
+            new_state = state.next_turn(state.board, False)
+        else:
+            turn_skips = 0
+
+        metrics["engine_time"] = time.perf_counter() - engine_start
+        metrics["invalid"] = invalid
+        game_log.add_turn(action, new_state, metrics)
+        if writer is not None:
+            writer.add_turn(action, new_state, metrics)
+        if verbose:
+            print("[%s (%s)] %s" % (competitor.name, state.turn, message), file=output)
 
         # If both agents skipped their turn twice (due to invalid board state, not timeouts), the game state must be
         # broken, so kill the board.
         if turn_skips >= 4:
             break
 
-    # Dump the log to the log file, if it's not none.
-    if logfile is not None:
+    # Finish the streamed log, or dump the whole log to the log file, if it's not none.
+    if writer is not None:
+        writer.close(game_log.winner())
+    elif logfile is not None:
         GameLog.to_file(game_log, logfile)
 
     return game_log.winner(), game_log
 
 
-def run_series(competitor1, competitor2, dictionary, num_games=5, turn_timeout=10, max_rounds=100, verbose=True, logdir=None):
+def _percentile(values, percent):
+    """
+    Return the given percentile of a sorted, non-empty list of values (by the nearest-rank method).
+    """
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+def summarize_metrics(logs):
+    """
+    Summarize the per-turn metrics of a list of game logs, returning a JSON-friendly map of competitor name -> map of
+    the number of turns; the p50/p95/p99 and maximum wall time of act() calls (in seconds); turns per second of agent
+    time; the timeout rate; the mean CPU time per turn; the largest peak RSS growth in a turn (in kilobytes); the
+    total engine time; and the totals of the counters the agent reported, along with their rates per second of agent
+    time. Turns without metrics are skipped.
+    """
+    turns = {}
+    for log in logs:
+        for metrics in log.metrics:
+            if metrics is not None:
+                name = log.red_name if metrics["turn"] == capitals.RED else log.blue_name
+                turns.setdefault(name, []).append(metrics)
+
+    summary = {}
+    for name, metrics in turns.items():
+        wall_times = sorted(turn["wall_time"] for turn in metrics)
+        cpu_times = [turn["cpu_time"] for turn in metrics if turn["cpu_time"] is not None]
+        rss_deltas = [turn["rss_delta"] for turn in metrics if turn["rss_delta"] is not None]
+        stats = {}
+        for turn in metrics:
+            for counter, value in (turn.get("stats") or {}).items():
+                stats[counter] = stats.get(counter, 0) + value
+        summary[name] = {
+            "turns": len(metrics),
+            "p50": _percentile(wall_times, 50),
+            "p95": _percentile(wall_times, 95),
+            "p99": _percentile(wall_times, 99),
+            "max": wall_times[-1],
+            "turns_per_second": len(metrics) / sum(wall_times) if sum(wall_times) > 0 else None,
+            "timeout_rate": sum(1 for turn in metrics if turn["timed_out"]) / float(len(metrics)),
+            "mean_cpu_time": sum(cpu_times) / len(cpu_times) if cpu_times else None,
+            "max_rss_delta": max(rss_deltas) if rss_deltas else None,
+            "engine_time": sum(turn.get("engine_time", 0.0) for turn in metrics),
+            "stats": stats,
+            "stats_per_second": { counter: total / sum(wall_times) for counter, total in stats.items() }
+                    if sum(wall_times) > 0 else {}
+        }
+
+    return summary
+
+def _tally(wins, game_num, winner):
+    """
+    Add the winner of the given game of a series to the [competitor1Wins, competitor2Wins, ties] tally.
+    """
+    if winner is None:
+        wins[2] += 1
+    elif (winner == capitals.RED) == (game_num % 2 == 0):
+        wins[0] += 1
+    else:
+        wins[1] += 1
+
+
+# The dictionary used by game worker processes, set up once per worker by init_worker.
+_worker_dictionary = None
+
+def init_worker(dictionary):
+    """
+    Pool initializer for game worker processes; keeps the dictionary around for every game the worker plays.
+    """
+    global _worker_dictionary
+    _worker_dictionary = dictionary
+
+def worker_dictionary():
+    """
+    Return the dictionary set up for this worker process by init_worker.
+    """
+    return _worker_dictionary
+
+def play_game_task(task):
+    """
+    Play a single game in a worker process, given (red competitor, blue competitor, run_game options), returning
+    (winner, game log JSON, printed output). Each worker runs games in its main thread, so call_with_timeout's SIGALRM
+    timeouts work the same as in a single process.
+    """
+    red_competitor, blue_competitor, options = task
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        winner, log = run_game(red_competitor, blue_competitor, _worker_dictionary, **options)
+
+    return winner, GameLog.to_json(log), output.getvalue()
+
+def game_summary(log):
+    """
+    Summarize a game log's turn metrics as a small JSON-friendly map: the number of turns and rounds played, and per
+    colour, the total wall time spent acting and the number of timeouts and invalid plays.
+    """
+    summary = { "turns": len(log.actions), "rounds": log.current_round() }
+    for color in (capitals.RED, capitals.BLUE):
+        turns = [metrics for metrics in log.metrics if metrics is not None and metrics["turn"] == color]
+        summary[color] = { "wall_time": sum(metrics["wall_time"] for metrics in turns),
+                "timeouts": sum(1 for metrics in turns if metrics["timed_out"]),
+                "invalid": sum(1 for metrics in turns if metrics["invalid"]) }
+
+    return summary
+
+def play_result_task(task):
+    """
+    Play a single game in a worker process like play_game_task, but return only (winner, game_summary()), for callers
+    which don't need the game log itself; the log only keeps its latest state in memory while the game is played.
+    """
+    red_competitor, blue_competitor, options = task
+    with contextlib.redirect_stdout(io.StringIO()):
+        winner, log = run_game(red_competitor, blue_competitor, _worker_dictionary, window=1, **options)
+
+    return winner, game_summary(log)
+
+def run_series(competitor1, competitor2, dictionary, num_games=5, turn_timeout=10, max_rounds=100, verbose=True, logdir=None,
+        seed=None, workers=1, sandbox=False, memory_limit=None, window=None):
     """
     Runs a series of games between two competitors, returning the number of wins for each competitor as a tuple of
     (competitor1Wins, competitor2Wins, ties), as well as a list of game logs.
 
-    If logdir is not None, then logs will be dumped to the given directory, named by the game number.
+    If logdir is not None, then logs will be streamed to the given directory, named by the game number. If window is
+    not None, the returned game logs only keep their latest window states in memory. Game <n> is played with seed
+    <seed + n>, so a series can be replayed exactly; if seed is None, a random base seed is drawn (and printed, if
+    verbose) instead, so that games played in forked worker processes don't share their letters. If workers is greater
+    than 1, games are played in parallel by a pool of that many processes; their output is still printed in game order.
+
+    If sandbox is True, each competitor's agents run in their own long-lived worker processes (see AgentWorker),
+    optionally limited to memory_limit bytes of memory each.
     """
 
     if logdir is not None:
         if not os.path.isdir(logdir):
             os.mkdir(logdir)
 
-    wins = [0, 0, 0]
-    logs = []
+    if seed is None:
+        seed = random.getrandbits(64)
+        if verbose:
+            print("Series seed: %d" % seed)
+
+    # Competitors alternate colors, with competitor1 playing red in even-numbered games.
+    tasks = []
     for game_num in range(num_games):
+        logfile = os.path.join(logdir, str(game_num) + ".jsonl") if logdir is not None else None
+        options = { "max_rounds": max_rounds, "turn_timeout": turn_timeout, "verbose": verbose, "logfile": logfile,
+                "seed": seed + game_num, "window": window }
+        if game_num % 2 == 0:
+            tasks.append((competitor1, competitor2, options))
+        else:
+            tasks.append((competitor2, competitor1, options))
+
+    # Sandboxed agents time out without signals, so parallel sandboxed games are played on threads instead of
+    # processes; each thread gets its own pair of worker processes, which it keeps for all of its games.
+    local = threading.local()
+    sandboxes = []
+
+    def play(indexed_task):
+        game_num, (red_competitor, blue_competitor, options) = indexed_task
+        if sandbox:
+            if not hasattr(local, "competitors"):
+                local.competitors = (SandboxedCompetitor(competitor1, dictionary, memory_limit),
+                        SandboxedCompetitor(competitor2, dictionary, memory_limit))
+                sandboxes.extend(local.competitors)
+            first, second = local.competitors
+            red_competitor, blue_competitor = (first, second) if game_num % 2 == 0 else (second, first)
+
+        if workers > 1:
+            output = io.StringIO()
+            winner, log = run_game(red_competitor, blue_competitor, dictionary, output=output, **options)
+            return winner, log, output.getvalue()
+
         if verbose:
             print()
             print("== GAME %d == " % game_num)
-        # TODO: Lots of code duplication, relatively suboptimal.
-        logfile = os.path.join(logdir, str(game_num) + ".json") if logdir is not None else None
-        if game_num % 2 == 0:
-            winner, log = run_game(competitor1, competitor2, dictionary, max_rounds=max_rounds, verbose=verbose,
-                    turn_timeout=turn_timeout, logfile=logfile)
+        winner, log = run_game(red_competitor, blue_competitor, dictionary, **options)
+        return winner, log, None
 
-            logs.append(log)
-            if winner == capitals.RED:
-                wins[0] += 1
-            elif winner == capitals.BLUE:
-                wins[1] += 1
-            else:
-                wins[2] += 1
+    wins = [0, 0, 0]
+    logs = []
+    pool = None
+    try:
+        if workers > 1 and not sandbox:
+            pool = multiprocessing.Pool(workers, init_worker, (dictionary,))
+            games = ((winner, GameLog.from_json(log_json, dictionary, LetterGenerator(options["seed"])), output)
+                    for (_, _, options), (winner, log_json, output) in zip(tasks, pool.imap(play_game_task, tasks)))
+        elif workers > 1:
+            pool = ThreadPool(workers)
+            games = pool.imap(play, enumerate(tasks))
         else:
-            winner, log = run_game(competitor2, competitor1, dictionary, max_rounds=max_rounds, verbose=verbose,
-                    logfile=logfile)
+            games = map(play, enumerate(tasks))
 
+        for game_num, (winner, log, output) in enumerate(games):
+            if verbose and output is not None:
+                print()
+                print("== GAME %d == " % game_num)
+                print(output, end="")
             logs.append(log)
-            if winner == capitals.RED:
-                wins[1] += 1
-            elif winner == capitals.BLUE:
-                wins[0] += 1
-            else:
-                wins[2] += 1
+            _tally(wins, game_num, winner)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        for competitor in sandboxes:
+            competitor.close()
 
     return tuple(wins), logs
 
@@ -177,9 +612,15 @@ if __name__ == "__main__":
     argparser.add_argument("--games", type=int, default=5, help="Number of games to run")
     argparser.add_argument("--logdir", type=str, default=None, help="Directory to dump log files to")
     argparser.add_argument("--turn_timeout", type=int, default=10, help="Number of seconds allowed per turn")
+    argparser.add_argument("--seed", type=int, default=None, help="Seed for reproducible games")
+    argparser.add_argument("--workers", type=int, default=1, help="Number of processes to play games in parallel")
+    argparser.add_argument("--sandbox", action="store_true", help="Run each agent in its own worker process")
+    argparser.add_argument("--window", type=int, default=None, help="Number of recent states to keep per game")
+    argparser.add_argument("--metrics", type=str, default=None, help="File to write the metrics summary to, as JSON")
+    argparser.add_argument("--memory_limit", type=int, default=None, help="Memory limit per sandboxed agent, in MB")
     args = argparser.parse_args()
 
-    dictionary = Dictionary.from_file("dict.txt")
+    dictionary = Dictionary.from_compiled("dict.txt")
     print("Dictionary: %d words" % len(dictionary))
 
     first_agent = None
@@ -198,8 +639,18 @@ if __name__ == "__main__":
 
     print("Game Series: %s vs. %s (%d games, %d rounds/game)" % (first_agent.name, second_agent.name, args.games, args.max_rounds))
     scores, logs = run_series(first_agent, second_agent, dictionary, num_games=args.games, max_rounds=args.max_rounds,
-            turn_timeout=args.turn_timeout, logdir=args.logdir)
+            turn_timeout=args.turn_timeout, logdir=args.logdir, seed=args.seed,
+            workers=args.workers, sandbox=args.sandbox, window=args.window,
+            memory_limit=args.memory_limit * 1024 * 1024 if args.memory_limit is not None else None)
 
     print()
     print("== FINAL SCORES ==")
     print("%s wins %d, %d ties, %s wins %d" % (first_agent.name, scores[0], scores[2], second_agent.name, scores[1]))
+
+    summary = summarize_metrics(logs)
+    print()
+    print("== METRICS ==")
+    print(json.dumps(summary, sort_keys=True, indent=4))
+    if args.metrics is not None:
+        with open(args.metrics, "w") as metrics_file:
+            json.dump(summary, metrics_file, sort_keys=True, indent=4)
@@ -1,8 +1,8 @@
 import random
-import copy
 import capitals as cap
 
 from collections import deque
+from geometry import NEIGHBORS, POSITION_INDEX, NEIGHBOR_MASKS, ALL_MASK, positions_mask, neighbor_mask, flood_mask
 
 def frequency_map(input_list):
     """
@@ -17,17 +17,6 @@ def frequency_map(input_list):
 
     return result
 
-def frequency_map_contained_by(first, second):
-    """
-    Returns true if the frequency counts of all of the items in the first map is less than or equal to
-    the frequency counts of the same items in the second map.
-    """
-    for key in first:
-        if key not in second or first[key] > second[key]:
-            return False
-
-    return True
-
 def invert_map(input_map):
     """
     Inverts a map from K -> V to V -> [K]. Since values may be duplicates, each value maps to a list of keys which
@@ -114,7 +103,7 @@ def score_board(board, team):
 
     # Third Heuristic: The local capital should not have tiles which are reachable from enemy territory.
     if our_capital is not None:
-        for adj in cap.adjacent_positions(our_capital):
+        for adj in NEIGHBORS[our_capital]:
             if adj in enemy_reachable_letters:
                 score -= 20
             elif board.get_tile(adj).startswith(cap.LETTER_PREFIX):
@@ -128,27 +117,158 @@ def score_board(board, team):
 
     return score
 
-def find_best_move_for_word(board, team, word, word_freq, letters_to_pos):
+class MoveScorer(object):
     """
-    Finds the best move (based on heuristic scores) for a given board; returns the move as well as it's score.
+    Scores moves for one player on one board exactly like score_board(board.use_tiles(tiles, team)[0], team), but
+    from tile masks computed once per turn rather than by building and flood-filling a new board for every move.
+    Scores are memoized by the set of played tiles, since many searches end on the same tiles.
+
+    Sets of tiles are passed around as masks over the position indices (see geometry).
     """
-    # Fancy implementation which looks at every way that a move can be constructed via a breadth first search.
-    word_letters = set(word)
-    our_territory = board.territory(team)
 
+    def __init__(self, board, team):
+        enemy = cap.enemy_color(team)
+        self.board = board
+        self.team = team
+        self.letters = board.find_all_letters()
+        self.territory = board.territory(team)
+        self.bits = { pos: 1 << POSITION_INDEX[pos] for pos in self.letters }
+
+        self.our_mask = positions_mask(self.territory)
+        self.enemy_mask = positions_mask(board.territory(enemy))
+        self.letter_mask = positions_mask(self.letters)
+        self.frontier = neighbor_mask(self.our_mask)
+        self.capturable = self.enemy_mask | (ALL_MASK & ~(self.our_mask | self.enemy_mask | self.letter_mask))
+        enemy_capital = board.capital(enemy)
+        self.enemy_capital_mask = 1 << POSITION_INDEX[enemy_capital] if enemy_capital is not None else 0
+        our_capital = board.capital(team)
+        self.guard_mask = NEIGHBOR_MASKS[POSITION_INDEX[our_capital]] if our_capital is not None else 0
+
+        # The letter tiles next to each tile, as (position, letter).
+        self.letter_neighbors = { pos: tuple((adj, self.letters[adj]) for adj in NEIGHBORS[pos]
+                if adj in self.letters) for pos in self.letters }
+
+        # The letters adjacent to our territory, in the order the search first meets them, as (position, letter).
+        self.border = []
+        seen = set()
+        for pos in self.territory:
+            for adj in NEIGHBORS[pos]:
+                if adj in self.letters and adj not in seen:
+                    seen.add(adj)
+                    self.border.append((adj, self.letters[adj]))
+
+        self.letter_masks = {}
+        for pos, letter in self.letters.items():
+            self.letter_masks[letter] = self.letter_masks.get(letter, 0) | self.bits[pos]
+
+        self.scores = {}
+        self.boards_scored = 0
+        self.bounds = {}
+
+    def score(self, tiles):
+        """
+        Return the score_board() score of the board after playing the given tiles.
+        """
+        return self.score_mask(positions_mask(tiles))
+
+    def score_mask(self, tiles_mask):
+        """
+        Return the score_board() score of the board after playing the tiles in the given mask.
+        """
+        score = self.scores.get(tiles_mask)
+        if score is None:
+            score = self.scores[tiles_mask] = self._score(tiles_mask)
+            self.boards_scored += 1
+
+        return score
+
+    def word_bound(self, word):
+        """
+        Return an upper bound on the score of any move which plays the given word. Only tiles with the word's letters
+        which are connected to our territory through other such tiles can become territory (and no more of each letter
+        than the word has), only enemy tiles next to those can be captured, and some of the tiles around our capital are
+        penalized whatever is played.
+        """
+        letters = frozenset(word)
+        reach = self.bounds.get(letters)
+        if reach is None:
+            word_mask = 0
+            for letter in letters:
+                word_mask |= self.letter_masks.get(letter, 0)
+            reach = flood_mask(self.frontier & word_mask, word_mask)
+            self.bounds[letters] = reach
+
+        capturable = neighbor_mask(reach) & self.enemy_mask
+        if capturable == self.enemy_mask:
+            return 99999999
+
+        connectable = sum(min(word.count(letter), bin(reach & self.letter_masks[letter]).count("1"))
+                for letter in letters)
+        bound = 2 * (bin(self.our_mask).count("1") + connectable)
+        bound -= bin(self.enemy_mask & ~capturable).count("1")
+        if self.enemy_capital_mask & ~capturable == 0:
+            bound += 100
+
+        # Letter tiles around our capital which can't become territory stay letters, and enemy tiles either stay
+        # enemy territory or are captured and become letters.
+        bound -= 4 * bin(self.guard_mask & ((self.letter_mask & ~reach) | self.enemy_mask)).count("1")
+        return bound
+
+    def _score(self, tiles_mask):
+        connected = flood_mask(self.frontier & tiles_mask, tiles_mask)
+        captured = neighbor_mask(connected) & self.capturable
+        enemy_mask = self.enemy_mask & ~captured
+        if enemy_mask == 0:
+            return 99999999
+
+        score = 0
+        if self.enemy_capital_mask & ~captured == 0:
+            score += 100
+
+        # Tiles next to our capital which the enemy can reach cost more than other letter tiles next to it.
+        letter_mask = (self.letter_mask & ~connected) | captured
+        reachable = flood_mask(enemy_mask, enemy_mask | letter_mask)
+        score -= 20 * bin(self.guard_mask & reachable).count("1")
+        score -= 4 * bin(self.guard_mask & letter_mask & ~reachable).count("1")
+
+        score += 2 * bin(self.our_mask | connected).count("1")
+        score -= bin(enemy_mask).count("1")
+        return score
+
+def find_best_move_for_word(board, team, word, word_freq, letters_to_pos, stats=None, scorer=None):
+    """
+    Finds the best move (based on heuristic scores) for a given board; returns the move as well as it's score. If
+    stats is given, the number of search nodes expanded and boards scored are added to its counters. Pass the same
+    MoveScorer for every word searched on a board, so that its setup and scores are shared between the words.
+    """
+    stats = stats if stats is not None else { "nodes_expanded": 0, "boards_scored": 0 }
+    scorer = scorer if scorer is not None else MoveScorer(board, team)
+    letter_neighbors = scorer.letter_neighbors
+    boards_scored = scorer.boards_scored
+
+    # Fancy implementation which looks at every way that a move can be constructed via a breadth first search.
     # The starting letters are letters in the word adjacent to our territory.
-    starting_letters = { adj: board.get_letter(adj)
-            for pos in our_territory for adj in cap.adjacent_positions(pos) if board.get_letter(adj) in word_letters }
-    starting_available = invert_map(starting_letters)
-
-    # The queue contains (partial action, remaining, available words).
-    visited = set([frozenset()])
-    queue = deque([(frozenset(), word_freq, starting_available)])
-    best_move = None
+    word_letters = set(word)
+    starting_available = {}
+    for pos, letter in scorer.border:
+        if letter in word_letters:
+            starting_available[letter] = starting_available.get(letter, ()) + (pos,)
+
+    # Partial actions are kept as masks, along with the order their tiles were added in (so the best one can be
+    # rebuilt exactly as complete_word() would build it). Available positions are kept in tuples which are shared
+    # between nodes, and only replaced for the letters a node adds to.
+    bits = scorer.bits
+    letter_bits = { letter: [bits[pos] for pos in letters_to_pos[letter]] for letter in word_freq }
+
+    # The queue contains (partial action mask, tiles in the order added, remaining, available words).
+    visited = set([0])
+    queue = deque([(0, (), word_freq, starting_available)])
+    best = None
     best_score = None
 
     while queue:
-        action, remaining, available = queue.popleft()
+        action, path, remaining, available = queue.popleft()
+        stats["nodes_expanded"] += 1
 
         # For each remaining letter, look through the available positions for the letter and add them to the queue.
         valid_children = 0
@@ -164,35 +284,46 @@ def find_best_move_for_word(board, team, word, word_freq, letters_to_pos):
 
             # Iterate through each available position, appending _new_ positions.
             for pos in available[letter]:
-                if pos in action:
+                bit = bits[pos]
+                if action & bit:
                     continue
 
                 valid_children += 1
 
-                new_action = action | frozenset([pos])
+                new_action = action | bit
                 if new_action in visited:
                     continue
                 visited.add(new_action)
 
-                new_available = copy.deepcopy(available)
-                for adj in cap.adjacent_positions(pos):
-                    pletter = board.get_letter(adj)
-                    if pletter is not None and pletter in new_remaining:
-                        if pletter in new_available:
-                            new_available[pletter].append(adj)
-                        else:
-                            new_available[pletter] = [adj]
+                new_available = dict(available)
+                for adj, pletter in letter_neighbors[pos]:
+                    if pletter in new_remaining:
+                        new_available[pletter] = new_available.get(pletter, ()) + (adj,)
 
-                queue.append((new_action, new_remaining, new_available))
+                queue.append((new_action, path + (pos,), new_remaining, new_available))
 
-        # If no valid children, then this is a terminal state which we need to complete.
+        # If no valid children, then this is a terminal state which we need to complete (as complete_word() does).
         if valid_children == 0:
-            completed = complete_word(letters_to_pos, action, remaining)
-            score = score_board(board.use_tiles(completed, team)[0], team)
-            if best_move is None or score > best_score:
-                best_move, best_score = completed, score
+            completed = action
+            for letter, needed in remaining.items():
+                for bit in letter_bits[letter]:
+                    if needed == 0:
+                        break
+                    if not action & bit:
+                        completed |= bit
+                        needed -= 1
 
-    return reorder_tiles(board, best_move, word), best_score
+            score = scorer.score_mask(completed)
+            if best is None or score > best_score:
+                best, best_score = (path, remaining), score
+
+    stats["boards_scored"] += scorer.boards_scored - boards_scored
+
+    path, remaining = best
+    action = frozenset()
+    for pos in path:
+        action = action | frozenset([pos])
+    return reorder_tiles(board, complete_word(letters_to_pos, action, remaining), word), best_score
 
 
 class L3x1c0nHack3rAgent(cap.Agent):
@@ -206,32 +337,43 @@ class L3x1c0nHack3rAgent(cap.Agent):
     - Minimizing enemy territory: i.e., minimize territory that the enemy holds.
 
     The agent scans through all playable words on the board and tries many letter choices, choosing the one that
-    maximizes the resulting board state.
+    maximizes the resulting board state. Words are searched in order of the best score they could possibly reach, and
+    the search stops once no remaining word could beat (or, earlier in the dictionary, tie) the best move found; this
+    gives the same move as searching every word in dictionary order.
     """
 
     def __init__(self):
-        # No initialization required.
-        pass
+        # Search counters for the last turn, reported through stats().
+        self.last_stats = None
+
+    def stats(self):
+        return self.last_stats
 
     def act(self, state):
-        pos_to_letters = state.board.find_all_letters()
-        letters_to_pos = invert_map(pos_to_letters)
-        letters_freq = frequency_map(pos_to_letters.values())
+        letters_to_pos = state.board.letters_to_positions()
+        scorer = MoveScorer(state.board, state.turn)
 
-        # For each word playable on the board...
+        # For each word playable on the board, from the highest bound down...
+        words = state.playable_words()
+        bounds = [scorer.word_bound(word) for word in words]
         best_move = None
         best_score = None
-        possible_words = 0
-        for word in state.dictionary:
-            word_freq = frequency_map(word)
-            if not frequency_map_contained_by(word_freq, letters_freq):
+        best_index = None
+        self.last_stats = { "possible_words": len(words), "words_searched": 0, "nodes_expanded": 0,
+                "boards_scored": 0 }
+        for index in sorted(range(len(words)), key=lambda index: (-bounds[index], index)):
+            # Ties go to the word which comes first in the dictionary, as they would in a scan over every word.
+            if best_move is not None and bounds[index] < best_score:
+                break
+            if best_move is not None and bounds[index] == best_score and index > best_index:
                 continue
-            
-            possible_words += 1
 
             # Choose the tiles which maximize territory gain with this word...
-            move, score = find_best_move_for_word(state.board, state.turn, word, word_freq, letters_to_pos)
-            if best_move is None or score > best_score:
-                best_move, best_score = move, score
+            word = words[index]
+            self.last_stats["words_searched"] += 1
+            move, score = find_best_move_for_word(state.board, state.turn, word, frequency_map(word), letters_to_pos,
+                    self.last_stats, scorer)
+            if best_move is None or score > best_score or (score == best_score and index < best_index):
+                best_move, best_score, best_index = move, score, index
 
         return best_move
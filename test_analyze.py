@@ -0,0 +1,56 @@
+import os
+import analyze
+import runner
+import capitals
+
+from capitals import Dictionary, GameLog
+
+def test_analyze_logs(tmpdir):
+    dictionary = Dictionary.from_compiled("dict.txt")
+    first = runner.Competitor.from_module("teams.first_word")
+    second = runner.Competitor.from_module("teams.longest_word")
+    logdir = str(tmpdir.mkdir("logs"))
+    _, logs = runner.run_series(first, second, dictionary, num_games=3, max_rounds=20, verbose=False, logdir=logdir,
+            seed=3)
+    GameLog.to_file(logs[0], os.path.join(logdir, "old.json"))
+    with open(os.path.join(logdir, "broken.json"), "w") as broken:
+        broken.write("{")
+
+    errors = []
+    summary = analyze.analyze([logdir], dictionary, on_error=lambda file_name, error: errors.append(file_name))
+    assert summary.games == 4 and summary.errors == 1
+    assert errors == [os.path.join(logdir, "broken.json")]
+
+    stats = summary.to_json()
+    winners = [log.winner() for log in logs + logs[:1]]
+    assert stats["win_rate"][capitals.RED] == winners.count(capitals.RED) / 4.0
+    played = [action for log in logs + logs[:1] for action in log.actions if action is not None]
+    assert sum(stats["word_length"]["counts"].values()) == len(played)
+    assert stats["territory"][0]["games"] == 4
+
+    # The streamed and JSON copies of the first game summarize the same way.
+    streamed = analyze.analyze_log(os.path.join(logdir, "0.jsonl"), dictionary)
+    assert analyze.analyze_log(os.path.join(logdir, "old.json"), dictionary) == dict(streamed,
+            file=os.path.join(logdir, "old.json"))
+    assert streamed["turns"] == len(logs[0])
+
+    # Round n ends with the first state of round n + 1 (or with the final state, for the last round).
+    end_of_round = {}
+    for previous, state in zip(logs[0].states, logs[0].states[1:]):
+        round_num = previous.round
+        if state.round != previous.round or state is logs[0].states[-1]:
+            end_of_round.setdefault(round_num, [state.board.territory_size(capitals.RED),
+                    state.board.territory_size(capitals.BLUE)])
+    assert streamed["territory"] == [end_of_round[round_num] for round_num in sorted(end_of_round)]
+
+    # The first round ends once blue has replied, so blue's first move counts towards it.
+    _, log = runner.run_game(first, runner.Competitor.from_module("teams.john"), dictionary, verbose=False, seed=5,
+            logfile=str(tmpdir.join("john.jsonl")))
+    game = analyze.analyze_log(str(tmpdir.join("john.jsonl")), dictionary)
+    second_round = next(state for state in log.states if state.round == 2)
+    assert second_round.turn == capitals.RED and second_round is not log.states[1]
+    assert game["territory"][0] == [second_round.board.territory_size(capitals.RED),
+            second_round.board.territory_size(capitals.BLUE)]
+
+    assert analyze.analyze([logdir], dictionary, workers=2).to_json() == stats
+    assert ("games", "", 4) in summary.to_rows()
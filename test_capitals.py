@@ -1,8 +1,10 @@
 import capitals
 import inspect
+import pickle
 import sys
+import pytest
 
-from capitals import Dictionary, Board, State, LetterGenerator
+from capitals import Dictionary, Board, State, GameLog, GameLogWriter, GameLogReader, LetterGenerator
 
 # Dictionary Tests
 def test_dictionary_from_list_len():
@@ -20,6 +22,118 @@ def test_dictionary_from_list_no_contains():
     assert not new_dict.contains("~")
 
 
+def test_dictionary_playable_words():
+    new_dict = Dictionary.from_list(["cat", "act", "tact", "at", "dog", "a"])
+    counts = { "C": 1, "A": 1, "T": 2 }
+
+    assert set(new_dict.playable_words(counts)) == set(["CAT", "ACT", "TACT", "AT", "A"])
+    assert set(new_dict.playable_words(counts, min_length=2, max_length=3)) == set(["CAT", "ACT", "AT"])
+    assert set(new_dict.playable_words({ "C": 1, "A": 1, "T": 1 })) == set(["CAT", "ACT", "AT", "A"])
+    assert list(new_dict.playable_words({})) == []
+
+def test_dictionary_playable_words_longest_first():
+    new_dict = Dictionary.from_list(["cat", "tact", "at", "a"])
+    words = list(new_dict.playable_words({ "C": 1, "A": 1, "T": 2 }, longest_first=True))
+
+    assert words == ["TACT", "CAT", "AT", "A"]
+
+def test_dictionary_feasible_mask():
+    np = pytest.importorskip("numpy")
+    new_dict = Dictionary.from_list(["cat", "act", "tact", "dog", "naïve"])
+
+    matrix = new_dict.letter_matrix()
+    assert matrix.words == ["ACT", "CAT", "DOG", "TACT"]
+    assert list(matrix.lengths) == [3, 3, 3, 4]
+
+    mask = new_dict.feasible_mask({ "C": 1, "A": 1, "T": 1, "D": 1 })
+    assert list(mask) == [True, True, False, False]
+
+def test_dictionary_feasible_mask_batch():
+    np = pytest.importorskip("numpy")
+    new_dict = Dictionary.from_list(["cat", "tact", "dog"])
+
+    boards = np.array([capitals.letter_vector({ "C": 1, "A": 1, "T": 2 }), capitals.letter_vector({ "D": 1, "O": 1, "G": 1 })])
+    masks = new_dict.feasible_mask_batch(boards)
+    assert masks.shape == (2, 3)
+    assert masks.tolist() == [[True, False, True], [False, True, False]]
+
+def test_dictionary_from_compiled(tmpdir):
+    dict_file = tmpdir.join("words.txt")
+    dict_file.write("cat\nact\ntact\ndog's\nno\nnaïve\n")
+
+    compiled = Dictionary.from_compiled(str(dict_file))
+    assert len(compiled) == 4
+    assert list(compiled) == ["ACT", "CAT", "NAÏVE", "TACT"]
+    assert compiled.contains("tact")
+    assert not compiled.contains("dog")
+    assert not compiled.contains("TAC")
+    assert set(compiled.playable_words({ "C": 1, "A": 1, "T": 2 })) == set(["ACT", "CAT", "TACT"])
+
+def test_dictionary_from_compiled_rebuilds_stale(tmpdir):
+    dict_file = tmpdir.join("words.txt")
+    dict_file.write("cat\n")
+    assert Dictionary.from_compiled(str(dict_file)).contains("cat")
+
+    dict_file.write("dog\nbird\n")
+    dict_file.setmtime(dict_file.mtime() + 10)
+    compiled = Dictionary.from_compiled(str(dict_file))
+    assert not compiled.contains("cat")
+    assert compiled.contains("bird")
+
+def test_dictionary_from_compiled_pickles(tmpdir):
+    dict_file = tmpdir.join("words.txt")
+    dict_file.write("cat\nact\n")
+
+    compiled = Dictionary.from_compiled(str(dict_file))
+    compiled.signature_trie()
+    copy = pickle.loads(pickle.dumps(compiled))
+    assert list(copy) == ["ACT", "CAT"]
+    assert set(copy.playable_words({ "C": 1, "A": 1, "T": 1 })) == set(["ACT", "CAT"])
+
+def test_dictionary_from_compiled_unpickle_missing(tmpdir):
+    dict_file = tmpdir.join("words.txt")
+    dict_file.write("cat\nact\n")
+
+    data = pickle.dumps(Dictionary.from_compiled(str(dict_file)))
+    tmpdir.join("words.txt.compiled").remove()
+    with pytest.raises(ValueError):
+        pickle.loads(data)
+
+# Letter generator tests
+def test_letter_generator_seeded():
+    first = LetterGenerator(seed=42, buffer_size=7)
+    second = LetterGenerator(seed=42)
+
+    letters = first.letters(100)
+    assert letters == second.letters(100)
+    assert first.drawn == 100
+    assert letters != LetterGenerator(seed=43).letters(100)
+
+def test_letter_generator_replay_fork():
+    lettergen = LetterGenerator(seed=7)
+    letters = lettergen.letters(50)
+    assert lettergen.replay().letters(50) == letters
+
+    # Forking generators in the same state gives the same child.
+    other = LetterGenerator(seed=7)
+    other.letters(50)
+    assert lettergen.fork().letters(20) == other.fork().letters(20)
+
+    # Choices and forks between buffer refills don't change the letters, so replays still match.
+    lettergen = LetterGenerator(seed=1, buffer_size=4)
+    letters = lettergen.letters(4)
+    chosen = lettergen.choice(list(range(100)))
+    letters += lettergen.letters(4)
+    child = lettergen.fork().letters(10)
+    letters += lettergen.letters(8)
+    replay = lettergen.replay()
+    assert replay.letters(4) == letters[:4]
+    assert replay.choice(list(range(100))) == chosen
+    assert replay.letters(4) == letters[4:8]
+    assert replay.fork().letters(10) == child
+    assert replay.letters(8) == letters[8:]
+    assert LetterGenerator(seed=1, buffer_size=4).letters(16) == letters
+
 # Position tests
 def test_valid_position():
     assert capitals.valid_position((0, 0))
@@ -86,6 +200,23 @@ def test_board_find_all_letters():
 
     assert board.find_all_letters() == { (1, 0): "X", (1, 1): "Q", (3, 4): "Z" }
 
+def test_board_letter_index():
+    board = Board({ (0, 0): capitals.RED, (1, 0): "LETTER_X", (1, 1): "LETTER_Q", (3, 4): "LETTER_X" })
+    board = board.set_tile((1, 1), capitals.BLUE).set_tile((2, 2), "LETTER_Q")
+
+    assert board.letter_positions("X") == [(1, 0), (3, 4)]
+    assert board.letter_positions("Z") == []
+    assert board.letters_to_positions() == { "X": [(1, 0), (3, 4)], "Q": [(2, 2)] }
+    assert board.letter_counts() == { "X": 2, "Q": 1 }
+
+def test_board_capitals_and_territory_size():
+    board = Board({ (0, 0): capitals.RED, (1, 0): capitals.RED_CAPITAL, (5, 5): capitals.BLUE })
+
+    assert board.red_capital() == (1, 0)
+    assert board.blue_capital() is None
+    assert board.territory_size(capitals.RED) == 2
+    assert board.territory_size(capitals.BLUE) == 1
+
 def test_board_floodfill():
     board = Board({ (0, 0): capitals.RED, (1, 0): capitals.RED_CAPITAL, (1, 1): capitals.RED, (0, 2): capitals.BLUE,
                     (1, 2): capitals.BLUE, (2, 2): capitals.RED, (3, 2): capitals.RED, (5, 7): capitals.RED })
@@ -102,6 +233,14 @@ def test_board_get_letter():
     assert board.get_letter((1, 0)) == "X"
     assert board.get_letter((1, 1)) == "Z"
 
+def test_board_connected_played_tiles():
+    board = Board({ (0, 0): capitals.RED, (1, 0): "LETTER_A", (2, 1): "LETTER_B", (4, 4): "LETTER_C",
+                    (0, 1): "LETTER_D" })
+
+    assert board.connected_played_tiles([(2, 1), (1, 0), (4, 4)], capitals.RED) == set([(1, 0), (2, 1)])
+    assert board.connected_played_tiles([(2, 1), (4, 4)], capitals.RED) == set()
+    assert board.connected_played_tiles([(0, 1)], capitals.BLUE) == set()
+
 def test_board_use_tiles():
     board = Board({ (0, 0): capitals.RED, (1, 0): capitals.RED_CAPITAL, (0, 1): "LETTER_X", (1, 1): "LETTER_Q", (0, 2):
         capitals.BLUE_CAPITAL, (4, 3): capitals.RED })
@@ -136,6 +275,204 @@ def test_board_use_tiles3():
 
         assert new_board.get_letter(pos) is not None
 
+def test_board_use_tiles_disconnected():
+    # Tiles which aren't connected to territory are just replaced with new letters.
+    board = Board({ (0, 0): capitals.RED, (1, 1): "LETTER_A", (5, 5): "LETTER_B", (5, 6): capitals.BLUE })
+
+    new_board, capital_cap = board.use_tiles([(1, 1), (5, 5)], capitals.RED, lambda: "Z")
+    assert new_board.get_tile((1, 1)) == capitals.RED
+    assert new_board.get_letter((5, 5)) == "Z"
+    assert new_board.get_tile((5, 6)) == capitals.BLUE
+    assert not capital_cap
+
+def test_board_invalid_tile_type():
+    try:
+        Board({ (0, 0): "PURPLE" })
+        assert False
+    except ValueError:
+        pass
+
+def test_board_map():
+    board = Board({ (0, 0): capitals.RED_CAPITAL, (1, 0): "LETTER_X" })
+
+    assert len(board.board) == len(capitals.valid_positions())
+    assert board.board[(0, 0)] == capitals.RED_CAPITAL
+    assert board.board[(1, 0)] == "LETTER_X"
+    assert board.board[(2, 2)] == capitals.EMPTY
+
+def test_board_evaluate_moves():
+    board = Board({ (0, 0): capitals.RED, (1, 0): capitals.RED_CAPITAL, (0, 1): "LETTER_X", (1, 1): "LETTER_Q", (0, 2):
+        capitals.BLUE_CAPITAL, (4, 3): capitals.RED, (5, 5): "LETTER_E" })
+
+    outcomes = board.evaluate_moves([[(0, 1), (1, 1)], [(5, 5)]], capitals.BLUE)
+    assert outcomes[0].connected == set([(0, 1), (1, 1)])
+    assert outcomes[0].captured_capital
+    assert set([(0, 0), (1, 0)]) <= outcomes[0].captured
+    assert outcomes[0].territory_size == 3
+    assert outcomes[0].enemy_territory_size == 1
+    assert outcomes[0].board is None
+
+    assert outcomes[1].connected == set()
+    assert outcomes[1].captured == set()
+    assert not outcomes[1].captured_capital
+    assert outcomes[1].territory_size == 1
+
+def test_board_evaluate_moves_boards():
+    board = Board({ (3, 3): capitals.BLUE, (4, 4): "LETTER_X" })
+
+    outcome = board.evaluate_moves([[(4, 4)]], capitals.BLUE, boards=True, lettergen=lambda: "Z")[0]
+    expected, _ = board.use_tiles([(4, 4)], capitals.BLUE, lambda: "Z")
+    assert outcome.board.board == expected.board
+
+def test_board_apply_move_undo():
+    board = Board({ (0, 0): capitals.RED, (1, 0): capitals.RED_CAPITAL, (0, 1): "LETTER_X", (1, 1): "LETTER_Q", (0, 2):
+        capitals.BLUE_CAPITAL, (4, 3): capitals.RED, (5, 5): "LETTER_E" })
+    before = board.board
+
+    drawn = []
+    letters = iter("ABCDEFGHIJ")
+    def lettergen():
+        drawn.append(next(letters))
+        return drawn[-1]
+
+    expected, expected_cap = board.use_tiles([(0, 1), (1, 1), (5, 5)], capitals.BLUE, lettergen)
+    record = board.apply_move([(0, 1), (1, 1), (5, 5)], capitals.BLUE, "ABCDEFGHIJ")
+    assert board.board == expected.board
+    assert record.captured_capital == expected_cap
+    assert record.captured_capital
+    assert record.letters_used == len(drawn)
+
+    board.undo(record)
+    assert board.board == before
+    assert board.blue_capital() == (0, 2)
+
+def test_board_apply_move_out_of_letters():
+    board = Board({ (3, 3): capitals.BLUE, (4, 4): "LETTER_X" })
+    before = board.board
+
+    try:
+        board.apply_move([(4, 4)], capitals.BLUE, "A")
+        assert False
+    except ValueError:
+        pass
+    assert board.board == before
+
+def test_board_derived_views():
+    board = Board({ (3, 3): capitals.RED_CAPITAL, (4, 4): "LETTER_A", (4, 3): "LETTER_B", (5, 5): "LETTER_A" })
+    dictionary = Dictionary.from_list(["ab", "aa", "aab"])
+
+    counts = board.letter_counts()
+    assert "letter_counts" in board._derived
+    assert counts == { "A": 2, "B": 1 }
+    assert set(board.frontier(capitals.RED)) == set([(4, 4), (4, 3)])
+    assert sorted(board.playable_words(dictionary)) == ["AA", "AAB", "AB"]
+
+    # Views are rebuilt after the board is modified in place, and again after it is restored.
+    record = board.apply_move([(4, 4)], capitals.RED, "C" * 6)
+    assert board.letter_counts()["A"] == 1
+    assert set(board.territory(capitals.RED)) == set([(3, 3), (4, 4)])
+    assert board.playable_words(dictionary) == ["AB"]
+    board.undo(record)
+    assert board.letter_counts() == counts
+    assert set(board.territory(capitals.RED)) == set([(3, 3)])
+
+    assert pickle.loads(pickle.dumps(board))._derived is None
+
+def test_board_views_are_copies():
+    board = Board({ (3, 3): capitals.RED_CAPITAL, (4, 4): "LETTER_A", (4, 3): "LETTER_B", (5, 5): "LETTER_A" })
+    dictionary = Dictionary.from_list(["ab", "aa", "aab"])
+
+    # Callers mutating a view don't change what later callers on the same board see.
+    board.territory(capitals.RED).append((0, 0))
+    board.frontier(capitals.RED).pop()
+    board.find_all_letters().pop((4, 4))
+    board.letters_to_positions()["A"].pop()
+    board.letter_counts()["A"] = 0
+    board.playable_words(dictionary).clear()
+
+    assert board.territory(capitals.RED) == [(3, 3)]
+    assert set(board.frontier(capitals.RED)) == set([(4, 4), (4, 3)])
+    assert board.find_all_letters() == { (4, 4): "A", (4, 3): "B", (5, 5): "A" }
+    assert sorted(board.letters_to_positions()["A"]) == [(4, 4), (5, 5)]
+    assert board.letter_counts() == { "A": 2, "B": 1 }
+    assert sorted(board.playable_words(dictionary)) == ["AA", "AAB", "AB"]
+
+def test_board_hash():
+    board = Board({ (0, 0): capitals.RED, (1, 0): capitals.RED_CAPITAL, (1, 1): "LETTER_A", (3, 3): "LETTER_B" })
+    same = Board({ (3, 3): "LETTER_B", (1, 1): "LETTER_A", (1, 0): capitals.RED_CAPITAL, (0, 0): capitals.RED })
+
+    assert board == same
+    assert hash(board) == hash(same)
+    assert board.zobrist_hash() != Board().zobrist_hash()
+    assert board.set_tile((1, 1), "LETTER_C") != board
+    assert board.set_tile((1, 1), "LETTER_C").set_tile((1, 1), "LETTER_A") == board
+
+def test_board_bytes_round_trip():
+    board = Board({ (0, 0): capitals.RED, (1, 0): capitals.RED_CAPITAL, (1, 1): "LETTER_A", (6, 8): capitals.BLUE,
+        (5, 7): capitals.BLUE_CAPITAL, (3, 3): "LETTER_Z" })
+
+    data = Board.to_bytes(board)
+    assert len(data) == 45
+    assert data[capitals.POSITION_INDEX[(1, 1)]] == capitals.CELL_LETTER << 5 | 0
+    assert data[capitals.POSITION_INDEX[(5, 7)]] == capitals.CELL_BLUE_CAPITAL << 5
+    assert Board.from_bytes(data) == board
+    assert Board.from_bytes(data).letter_positions("Z") == [(3, 3)]
+
+    with pytest.raises(ValueError):
+        Board.from_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        Board.from_bytes(bytes([255]) + data[1:])
+    with pytest.raises(ValueError):
+        Board.to_bytes(Board({ (0, 0): "LETTER_Ï" }))
+
+def test_boards_array():
+    np = pytest.importorskip("numpy")
+    boards = [Board.initial(LetterGenerator(seed)) for seed in range(3)]
+    cells = capitals.boards_array([Board.to_bytes(board) for board in boards])
+    assert cells.shape == (3, 45)
+    assert ((cells >> 5) == capitals.CELL_RED_CAPITAL).sum(axis=1).tolist() == [1, 1, 1]
+
+    counts = capitals.boards_letter_counts(cells)
+    for board, row in zip(boards, counts):
+        assert row.tolist() == capitals.letter_vector(board.letter_counts()).tolist()
+
+def test_board_parse_position():
+    assert Board.parse_position("(3, 4)") == (3, 4)
+    assert Board.parse_position("(3,4)") == (3, 4)
+    with pytest.raises(ValueError):
+        Board.parse_position("3, 4")
+
+def test_board_hash_incremental():
+    board = Board({ (0, 0): capitals.RED, (1, 0): capitals.RED_CAPITAL, (0, 1): "LETTER_X", (1, 1): "LETTER_Q", (0, 2):
+        capitals.BLUE_CAPITAL, (4, 3): capitals.RED })
+
+    new_board, _ = board.use_tiles([(0, 1), (1, 1)], capitals.BLUE, lambda: "Z")
+    assert new_board.zobrist_hash() == Board(new_board.board).zobrist_hash()
+
+    record = board.apply_move([(0, 1), (1, 1)], capitals.BLUE, "ZZZZZZZZ")
+    assert board.zobrist_hash() == new_board.zobrist_hash()
+    board.undo(record)
+    assert board.zobrist_hash() == Board(board.board).zobrist_hash()
+
+def test_transposition_table():
+    table = capitals.TranspositionTable(capacity=2)
+
+    table.put(1, "a", depth=2)
+    table.put(2, "b", depth=1)
+    assert table.get(1) == "a"
+    assert table.get(1, depth=3) is None
+    assert table.get(3) is None
+
+    # Shallower results don't replace deeper ones.
+    table.put(1, "c", depth=1)
+    assert table.get(1) == "a"
+
+    # When full, the shallowest of the least recently used entries goes first.
+    table.put(3, "d", depth=5)
+    assert len(table) == 2
+    assert 2 not in table
+    assert table.get(1) == "a" and table.get(3) == "d"
+
 # Game State tests
 def test_state_next_turn():
     dictionary = Dictionary.from_list(["a", "ab", "abc", "abcd"])
@@ -180,6 +517,26 @@ def test_state_winner():
     state_blue_win = state.act([(5, 5)]).act([(3, 3)])
     assert state_blue_win.winner() == capitals.BLUE
 
+def test_state_seeded_capital_respawn():
+    dictionary = Dictionary.from_list(["a", "ab", "abc", "abcd"])
+    board = Board({ (2, 2): capitals.RED_CAPITAL, (1, 1): capitals.RED, (3, 3): "LETTER_A", (4, 4):
+        capitals.BLUE_CAPITAL, (5, 5): capitals.BLUE, (5, 6): capitals.BLUE, (6, 6): capitals.BLUE, (3, 5): "LETTER_A" })
+
+    boards = []
+    for _ in range(2):
+        state = State(dictionary, board, LetterGenerator(seed=3))
+        boards.append(state.act([(3, 3)]).act([(3, 5)]).board)
+
+    assert boards[0] == boards[1]
+    assert boards[0].blue_capital() is not None
+
+def test_state_hash_turn():
+    dictionary = Dictionary.from_list(["abc"])
+    state = State.initial(dictionary)
+
+    assert state.zobrist_hash() != state.next_turn(state.board, False).zobrist_hash()
+    assert state.zobrist_hash() == state.next_turn(state.board, True).zobrist_hash()
+
 def test_state_capture_capital():
     dictionary = Dictionary.from_list(["a", "ab", "abc", "abcd"])
     board = Board({ (2, 2): capitals.RED_CAPITAL, (1, 1): capitals.RED, (3, 3): "LETTER_A", (4, 4):
@@ -195,3 +552,145 @@ def test_state_capture_capital():
     # Have red waste the turn; we should see a blue capital show up again.
     state_red2 = state_red.act([(3, 5)])
     assert state_red2.board.blue_capital() == (5, 5)
+
+def test_state_legal_moves():
+    dictionary = Dictionary.from_list(["aa", "ab", "b"])
+    board = Board({ (2, 2): capitals.RED_CAPITAL, (3, 3): "LETTER_A", (3, 5): "LETTER_A", (1, 1): "LETTER_B", (4, 4):
+        capitals.BLUE_CAPITAL })
+    state = State(dictionary, board)
+
+    moves = list(state.legal_moves())
+    assert sorted((word, sorted(positions)) for word, positions in moves) == [("AA", [(3, 3), (3, 5)]),
+            ("AB", [(1, 1), (3, 3)]), ("AB", [(1, 1), (3, 5)]), ("B", [(1, 1)])]
+    for word, positions in moves:
+        assert state.board.get_word(positions) == word
+        state.act(positions)
+
+    # Playing "b" connects the same tiles as playing "ab" with the far "a".
+    deduped = list(state.legal_moves(connected_only=True, dedupe=True))
+    assert len(deduped) == 3
+    assert len(list(state.legal_moves(limit=2))) == 2
+
+    blue = State(dictionary, board, turn=capitals.BLUE)
+    assert [word for word, _ in blue.legal_moves(connected_only=True)] == ["AA", "AB"]
+
+# Game log tests
+def played_log(turns, window = None):
+    dictionary = Dictionary.from_list(capitals.LETTERS)
+    lettergen = LetterGenerator(7)
+    log = GameLog.initial(State.initial(dictionary, lettergen), "Red", "Blue", window)
+    for turn in range(turns):
+        state = log.current_state()
+        action = [sorted(state.board.find_all_letters())[0]]
+        log.act(action, { "turn": state.turn, "index": turn })
+
+    return log
+
+def test_game_log_window():
+    log = played_log(6, window = 2)
+    full = played_log(6)
+    assert len(log) == 6
+    assert len(log.states) == 2 and log.first_state == 5
+    assert log.current_state().board == full.current_state().board
+    assert len(log.metrics) == 6
+
+def test_game_log_window_to_file(tmpdir):
+    with pytest.raises(ValueError):
+        GameLog.to_file(played_log(6, window = 2), str(tmpdir.join("game.json")))
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_game_log_streaming(tmpdir, compact):
+    log_file = str(tmpdir.join("game.jsonl"))
+    full = played_log(5)
+    writer = GameLogWriter(log_file, full.states[0], "Red", "Blue", { "seed": 7 }, compact)
+    for action, state, metrics in zip(full.actions, full.states[1:], full.metrics):
+        writer.add_turn(action, state, metrics)
+    writer.close(full.winner())
+
+    with GameLogReader(log_file, full.states[0].dictionary, LetterGenerator()) as reader:
+        assert (reader.red_name, reader.blue_name, reader.settings) == ("Red", "Blue", { "seed": 7 })
+        turns = list(reader)
+    assert [action for action, _, _ in turns] == full.actions
+    assert [state.board for _, state, _ in turns] == [state.board for state in full.states[1:]]
+    assert [metrics for _, _, metrics in turns] == full.metrics
+
+    loaded = GameLog.from_file(log_file, full.states[0].dictionary, LetterGenerator())
+    assert loaded.actions == full.actions
+    assert [state.board for state in loaded.states] == [state.board for state in full.states]
+
+    # A log cut off partway through a record can still be read up to the last complete turn.
+    with open(log_file) as f:
+        lines = f.readlines()
+    with open(log_file, "w") as f:
+        f.writelines(lines[:4] + [lines[4][:20]])
+    assert len(GameLog.from_file(log_file, full.states[0].dictionary, LetterGenerator())) == 3
+
+def test_game_log_from_file_json(tmpdir):
+    log_file = str(tmpdir.join("game.json"))
+    full = played_log(3)
+    GameLog.to_file(full, log_file)
+    loaded = GameLog.from_file(log_file, full.states[0].dictionary, LetterGenerator())
+    assert loaded.actions == full.actions
+    assert loaded.metrics == full.metrics
+
+def test_game_log_from_json_legacy():
+    full = played_log(2)
+    legacy = { "states": [{ "board": Board.to_json(state.board), "turn": state.turn, "round": state.round }
+        for state in full.states], "actions": [[repr(pos) for pos in action] for action in full.actions],
+        "red": "Red", "blue": "Blue" }
+
+    loaded = GameLog.from_json(legacy, full.states[0].dictionary, LetterGenerator())
+    assert loaded.actions == full.actions
+    assert [state.board for state in loaded.states] == [state.board for state in full.states]
+
+def test_game_log_compact_replay(tmpdir):
+    log_file = str(tmpdir.join("game.jsonl"))
+    full = played_log(40)
+    with GameLogWriter(log_file, full.states[0], "Red", "Blue", keyframe_interval = 8) as writer:
+        for action, state, metrics in zip(full.actions, full.states[1:], full.metrics):
+            writer.add_turn(action, state, metrics)
+        writer.close(full.winner())
+
+    loaded = GameLog.from_file(log_file, full.states[0].dictionary, LetterGenerator())
+    assert len(loaded.states) == len(full.states)
+    assert len(loaded.states.keyframes) == 5
+    for index in [40, 3, 17, 16, 0, 39, -1]:
+        state, expected = loaded.states[index], full.states[index]
+        assert (state.board, state.turn, state.round) == (expected.board, expected.turn, expected.round)
+    assert [state.board for state in loaded.states] == [state.board for state in full.states]
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_indexed_game_log(tmpdir, compact):
+    log_file = str(tmpdir.join("game.jsonl"))
+    full = played_log(40)
+    GameLogWriter.write(full, log_file, compact = compact)
+
+    indexed = GameLog.open(log_file, full.states[0].dictionary, LetterGenerator())
+    assert isinstance(indexed, capitals.IndexedGameLog)
+    assert len(indexed) == 40 and len(indexed.states) == 41
+    for index in [40, 3, 17, 16, 0, 39, -1, 33]:
+        state, expected = indexed.states[index], full.states[index]
+        assert (state.board, state.turn, state.round) == (expected.board, expected.turn, expected.round)
+    assert indexed.actions[5] == full.actions[5]
+    assert list(indexed.metrics) == full.metrics
+    assert indexed.winner() == full.winner()
+
+    with pytest.raises(ValueError):
+        indexed.act(full.actions[0])
+
+def test_game_log_open_json(tmpdir):
+    log_file = str(tmpdir.join("game.json"))
+    full = played_log(3)
+    GameLog.to_file(full, log_file)
+    assert GameLog.open(log_file, full.states[0].dictionary, LetterGenerator()).actions == full.actions
+
+def test_state_turn_delta():
+    log = played_log(1)
+    before, after = log.states
+    letters, respawn = before.turn_delta(log.actions[0], after)
+    assert respawn is None
+    assert before.replay(log.actions[0], letters).board == after.board
+    with pytest.raises(ValueError):
+        before.replay(log.actions[0], letters + "A")
+    assert before.turn_delta(None, before.next_turn(before.board, False)) == ("", None)
+    assert before.turn_delta(None, after) is None
@@ -0,0 +1,31 @@
+import geometry
+
+# Table tests
+def test_positions_canonical_order():
+    assert list(geometry.POSITIONS) == geometry.compute_positions()
+    assert geometry.NUM_POSITIONS == 45
+    assert geometry.POSITIONS[0] == (0, 0)
+
+def test_position_index():
+    for index, pos in enumerate(geometry.POSITIONS):
+        assert geometry.POSITION_INDEX[pos] == index
+        assert pos in geometry.VALID_POSITIONS
+
+def test_neighbors():
+    assert set(geometry.NEIGHBORS[(0, 0)]) == set([(1, 0), (0, 1), (1, 1)])
+    for pos in geometry.POSITIONS:
+        assert list(geometry.NEIGHBORS[pos]) == geometry.compute_adjacent(pos)
+
+# Mask tests
+def test_mask_round_trip():
+    positions = [(0, 0), (3, 4), (6, 8)]
+    assert geometry.mask_positions(geometry.positions_mask(positions)) == positions
+
+def test_neighbor_mask():
+    mask = geometry.neighbor_mask(geometry.positions_mask([(0, 0)]))
+    assert set(geometry.mask_positions(mask)) == set([(1, 0), (0, 1), (1, 1)])
+
+def test_flood_mask():
+    allowed = geometry.positions_mask([(1, 0), (2, 1), (5, 5)])
+    visited = geometry.flood_mask(geometry.positions_mask([(0, 0)]), allowed)
+    assert set(geometry.mask_positions(visited)) == set([(0, 0), (1, 0), (2, 1)])
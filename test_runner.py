@@ -0,0 +1,166 @@
+import time
+import pytest
+import runner
+import capitals
+
+from capitals import Dictionary, State, GameLog, LetterGenerator
+
+def test_run_series_workers():
+    dictionary = Dictionary.from_compiled("dict.txt")
+    first = runner.Competitor.from_module("teams.first_word")
+    second = runner.Competitor.from_module("teams.longest_word")
+
+    scores, logs = runner.run_series(first, second, dictionary, num_games=3, verbose=False, seed=5)
+    parallel_scores, parallel_logs = runner.run_series(first, second, dictionary, num_games=3, verbose=False, seed=5,
+            workers=2)
+    assert parallel_scores == scores
+    assert [log.red_name for log in parallel_logs] == ["First Word", "Longest Word", "First Word"]
+    assert [log.winner() for log in parallel_logs] == [log.winner() for log in logs]
+    assert [len(log.states) for log in parallel_logs] == [len(log.states) for log in logs]
+
+    sandboxed_scores, sandboxed_logs = runner.run_series(first, second, dictionary, num_games=3, verbose=False, seed=5,
+            workers=2, sandbox=True)
+    assert sandboxed_scores == scores
+    assert [len(log.states) for log in sandboxed_logs] == [len(log.states) for log in logs]
+
+def test_run_series_unseeded_workers():
+    dictionary = Dictionary.from_compiled("dict.txt")
+    first = runner.Competitor.from_module("teams.first_word")
+
+    _, logs = runner.run_series(first, first, dictionary, num_games=3, verbose=False, max_rounds=2, workers=2)
+    seeds = [log.current_state().lettergen.seed for log in logs]
+    assert seeds == [seeds[0], seeds[0] + 1, seeds[0] + 2]
+
+class SlowAgent(object):
+    """
+    Agent which sleeps through the first round, and then plays the first letter on the board.
+    """
+    def act(self, state):
+        if state.round == 1:
+            time.sleep(10)
+        return [sorted(state.board.find_all_letters())[0]]
+
+class BrokenAgent(object):
+    def act(self, state):
+        raise RuntimeError("broken")
+
+def test_agent_worker_timeout_restarts():
+    dictionary = Dictionary.from_list(["a"])
+    competitor = runner.SandboxedCompetitor(runner.Competitor("Slow", [], SlowAgent), dictionary)
+    state = State.initial(dictionary, LetterGenerator(0))
+    try:
+        agent = competitor.create_agent()
+        with pytest.raises(runner.TimedOutException):
+            agent.act(state, 1)
+
+        later = State(dictionary, state.board, state.lettergen, state.turn, 2)
+        assert agent.act(later, 5) == [sorted(state.board.find_all_letters())[0]]
+    finally:
+        competitor.close()
+
+def test_agent_worker_skips_errors():
+    dictionary = Dictionary.from_list(["a"])
+    competitor = runner.SandboxedCompetitor(runner.Competitor("Broken", [], BrokenAgent), dictionary)
+    state = State.initial(dictionary, LetterGenerator(0))
+    try:
+        assert competitor.create_agent().act(state, 5) is None
+    finally:
+        competitor.close()
+
+class MeddlingAgent(object):
+    """
+    Agent which plays a letter in place on the board it's given and never undoes it, then skips its turn.
+    """
+    def act(self, state):
+        state.board.apply_move([sorted(state.board.find_all_letters())[0]], state.turn, "A" * 6)
+        return None
+
+def test_run_game_copies_agent_boards():
+    dictionary = Dictionary.from_list(["a"])
+    meddling = runner.Competitor("Meddling", [], MeddlingAgent)
+
+    winner, log = runner.run_game(meddling, meddling, dictionary, verbose=False, seed=0)
+    assert winner is None
+    initial = State.initial(dictionary, LetterGenerator(0)).board
+    assert all(state.board == initial for state in log.states)
+
+def test_run_game_records_metrics():
+    dictionary = Dictionary.from_compiled("dict.txt")
+    first = runner.Competitor.from_module("teams.first_word")
+    second = runner.Competitor.from_module("teams.longest_word")
+
+    winner, log = runner.run_game(first, second, dictionary, verbose=False, seed=2)
+    assert len(log.metrics) == len(log.actions)
+    for metrics in log.metrics:
+        assert metrics["wall_time"] >= 0 and metrics["engine_time"] >= 0
+        assert not metrics["timed_out"]
+
+    copy = GameLog.from_json(GameLog.to_json(log), dictionary, LetterGenerator())
+    assert copy.metrics == log.metrics
+
+    summary = runner.summarize_metrics([log])
+    assert set(summary) == set(["First Word", "Longest Word"])
+    assert sum(competitor["turns"] for competitor in summary.values()) == len(log.actions)
+    assert summary["First Word"]["p50"] <= summary["First Word"]["p99"] <= summary["First Word"]["max"]
+    assert summary["First Word"]["timeout_rate"] == 0.0
+
+class CountingAgent(capitals.Agent):
+    """
+    Agent which always skips its turn, reporting how many turns it has been asked to play.
+    """
+    def __init__(self):
+        self.turns = 0
+
+    def act(self, state):
+        self.turns += 1
+        return None
+
+    def stats(self):
+        return { "turns": self.turns }
+
+def test_run_game_records_agent_stats():
+    dictionary = Dictionary.from_list(["a"])
+    counting = runner.Competitor("Counting", [], CountingAgent)
+    plain = runner.Competitor("Plain", [], capitals.Agent)
+
+    winner, log = runner.run_game(counting, plain, dictionary, verbose=False, seed=0)
+    assert [metrics["stats"] for metrics in log.metrics] == [{ "turns": 1 }, None, { "turns": 2 }, None]
+    assert runner.summarize_metrics([log])["Counting"]["stats"] == { "turns": 3 }
+
+    sandboxed = runner.SandboxedCompetitor(counting, dictionary)
+    try:
+        winner, log = runner.run_game(sandboxed, plain, dictionary, verbose=False, seed=0)
+        assert log.metrics[2]["stats"] == { "turns": 2 }
+    finally:
+        sandboxed.close()
+
+def test_run_game_window_needs_streamed_log(tmpdir):
+    dictionary = Dictionary.from_compiled("dict.txt")
+    first = runner.Competitor.from_module("teams.first_word")
+    with pytest.raises(ValueError):
+        runner.run_game(first, first, dictionary, verbose=False, window=2, logfile=str(tmpdir.join("game.json")))
+
+    log_file = str(tmpdir.join("game.jsonl"))
+    _, log = runner.run_game(first, first, dictionary, verbose=False, seed=1, window=2, logfile=log_file)
+    assert len(GameLog.from_file(log_file, dictionary, LetterGenerator()).states) == len(log) + 1
+
+class LookaheadAgent(object):
+    """
+    Agent which plays the same moves as the first word agent, but first tries them out on the state it is given.
+    """
+    def act(self, state):
+        move = next(state.legal_moves(), None)
+        if move is not None:
+            state.act(move[1])
+            state.lettergen.letters(100)
+        return None if move is None else move[1]
+
+def test_run_game_agent_letters_are_separate():
+    dictionary = Dictionary.from_compiled("dict.txt")
+    first = runner.Competitor.from_module("teams.first_word")
+    lookahead = runner.Competitor("Lookahead", [], LookaheadAgent)
+
+    _, log = runner.run_game(first, first, dictionary, verbose=False, seed=4)
+    _, lookahead_log = runner.run_game(lookahead, first, dictionary, verbose=False, seed=4)
+    assert lookahead_log.actions == log.actions
+    assert lookahead_log.current_state().board == log.current_state().board
@@ -0,0 +1,59 @@
+import random
+import capitals
+
+from capitals import Dictionary, State, LetterGenerator
+from teams.tres import main as tres
+
+def random_states(dictionary, count, turns):
+    """
+    Generate mid-game states reached by playing random tiles from seeded initial states.
+    """
+    for seed in range(count):
+        rng = random.Random(seed)
+        state = State.initial(dictionary, LetterGenerator(seed))
+        for _ in range(turns):
+            letters = sorted(state.board.find_all_letters())
+            tiles = rng.sample(letters, min(len(letters), 4))
+            new_board, captured = state.board.use_tiles(tiles, state.turn, state.lettergen)
+            state = state.next_turn(new_board, captured)
+        yield state
+
+def test_tres_move_scorer():
+    dictionary = Dictionary.from_list(["a"])
+    for state in random_states(dictionary, 20, 15):
+        for team in (capitals.RED, capitals.BLUE):
+            scorer = tres.MoveScorer(state.board, team)
+            letters = sorted(scorer.letters)
+            rng = random.Random(len(letters))
+            for _ in range(10):
+                tiles = rng.sample(letters, min(len(letters), rng.randint(1, 6)))
+                expected = tres.score_board(state.board.use_tiles(tiles, team)[0], team)
+                assert scorer.score(tiles) == expected
+
+def test_tres_plays_legal_moves():
+    dictionary = Dictionary.from_compiled("dict.txt")
+    agent = tres.L3x1c0nHack3rAgent()
+    for state in random_states(dictionary, 5, 10):
+        if state.winner() is None and state.playable_words():
+            state.act(agent.act(state))
+            assert agent.stats()["boards_scored"] <= agent.stats()["nodes_expanded"]
+
+def test_tres_pruned_search_matches_full_scan():
+    dictionary = Dictionary.from_compiled("dict.txt")
+    for state in random_states(dictionary, 5, 12):
+        if state.winner() is not None:
+            continue
+
+        letters_to_pos = state.board.letters_to_positions()
+        scorer = tres.MoveScorer(state.board, state.turn)
+        best_move, best_score = None, None
+        for word in state.playable_words():
+            move, score = tres.find_best_move_for_word(state.board, state.turn, word, tres.frequency_map(word),
+                    letters_to_pos, scorer=scorer)
+            assert score <= scorer.word_bound(word)
+            if best_move is None or score > best_score:
+                best_move, best_score = move, score
+
+        agent = tres.L3x1c0nHack3rAgent()
+        assert agent.act(state) == best_move
+        assert agent.stats()["words_searched"] <= agent.stats()["possible_words"]
@@ -0,0 +1,80 @@
+import pytest
+import tournament
+
+from capitals import Dictionary, RED, BLUE
+
+def test_find_teams():
+    teams = tournament.find_teams()
+    assert "teams.first_word" in teams
+    assert teams == sorted(teams)
+
+def test_schedule_swaps_colors():
+    games = tournament.schedule(["a", "b", "c"], games_per_pairing=2)
+    assert len(games) == 6
+    assert ("a|b|0", "a", "b") in games
+    assert ("a|b|1", "b", "a") in games
+
+def test_crosstable_and_ratings():
+    results = [{ "red": "a", "blue": "b", "winner": RED }, { "red": "b", "blue": "a", "winner": None },
+            { "red": "b", "blue": "c", "winner": BLUE }]
+    table = tournament.crosstable(["a", "b", "c"], results)
+    assert table["a"]["b"] == [1, 1, 0]
+    assert table["b"]["a"] == [0, 1, 1]
+    assert table["c"]["b"] == [1, 0, 0]
+    assert table["a"]["c"] == [0, 0, 0]
+
+    ratings = tournament.ratings(table)
+    assert ratings["a"] > ratings["b"]
+    assert ratings["c"] > ratings["b"]
+    assert abs(sum(ratings.values()) / 3 - 1500) < 1e-6
+
+def test_run_tournament_resumes(tmpdir):
+    dictionary = Dictionary.from_compiled("dict.txt")
+    teams = ["teams.first_word", "teams.longest_word"]
+    results_file = str(tmpdir.join("results.jsonl"))
+
+    results = tournament.run_tournament(teams, dictionary, results_file, verbose=False, seed=1)
+    assert len(results) == 2
+
+    # Drop the last result and leave a partially written line behind, as if the tournament was killed.
+    lines = open(results_file).read().splitlines()
+    with open(results_file, "w") as results_out:
+        results_out.write(lines[0] + "\n" + lines[1] + "\n" + lines[2][:10])
+
+    # The replayed game's timings differ, but the game itself is the same.
+    def outcomes(results):
+        return { game_id: (result["winner"], result["summary"]["turns"]) for game_id, result in results.items() }
+
+    resumed = tournament.run_tournament(teams, dictionary, results_file, verbose=False, seed=1)
+    assert outcomes(resumed) == outcomes(results)
+    assert tournament.load_results(results_file) == resumed
+
+def test_run_tournament_records_settings(tmpdir):
+    dictionary = Dictionary.from_compiled("dict.txt")
+    teams = ["teams.first_word", "teams.longest_word"]
+    results_file = str(tmpdir.join("results.jsonl"))
+
+    results = tournament.run_tournament(teams, dictionary, results_file, verbose=False, seed=1, max_rounds=20)
+    assert tournament.load_settings(results_file) == { "seed": 1, "max_rounds": 20, "turn_timeout": 10 }
+    for result in results.values():
+        assert 0 < result["summary"]["rounds"] <= 21
+        assert result["summary"]["turns"] > 0
+        assert result["summary"][RED]["timeouts"] == 0
+
+    with pytest.raises(ValueError):
+        tournament.run_tournament(teams, dictionary, results_file, verbose=False, seed=2, max_rounds=20)
+    with pytest.raises(ValueError):
+        tournament.run_tournament(teams, dictionary, results_file, verbose=False, seed=1)
+    assert tournament.load_results(results_file) == results
+
+def test_run_tournament_seeds_by_game_id(tmpdir):
+    dictionary = Dictionary.from_compiled("dict.txt")
+    teams = ["teams.first_word", "teams.longest_word"]
+
+    results = tournament.run_tournament(teams, dictionary, str(tmpdir.join("two.jsonl")), verbose=False, seed=3,
+            max_rounds=20)
+    more = tournament.run_tournament(teams, dictionary, str(tmpdir.join("four.jsonl")), verbose=False, seed=3,
+            max_rounds=20, games_per_pairing=4)
+    for game_id, result in results.items():
+        assert more[game_id]["winner"] == result["winner"]
+        assert more[game_id]["summary"]["turns"] == result["summary"]["turns"]
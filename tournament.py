@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# Round-robin tournament between every Capitals AI under teams/; plays each pairing with both colour assignments,
+# records results as they come in (so an interrupted tournament can be resumed), and prints a crosstable and ratings.
+
+import os
+import sys
+import json
+import math
+import zlib
+import random
+import argparse
+import multiprocessing
+import capitals
+import runner
+
+from capitals import Dictionary
+from runner import Competitor
+
+def find_teams(directory="teams"):
+    """
+    Return the module names (e.g., 'teams.tres') of every package in the given directory with a config.py, sorted.
+    """
+    teams = []
+    for name in sorted(os.listdir(directory)):
+        if os.path.isfile(os.path.join(directory, name, "config.py")):
+            teams.append(directory + "." + name)
+
+    return teams
+
+def schedule(teams, games_per_pairing=2):
+    """
+    Return the games of a round-robin between the given teams as a list of (game id, red team, blue team); every pair
+    plays games_per_pairing games, alternating which team plays red.
+    """
+    games = []
+    for i, first in enumerate(teams):
+        for second in teams[i + 1:]:
+            for game_num in range(games_per_pairing):
+                red, blue = (first, second) if game_num % 2 == 0 else (second, first)
+                games.append(("%s|%s|%d" % (first, second, game_num), red, blue))
+
+    return games
+
+def load_settings(file_name):
+    """
+    Load the game settings recorded in a results file's header line, or None if the file is missing or has no header.
+    """
+    if not os.path.isfile(file_name):
+        return None
+
+    with open(file_name) as results_file:
+        try:
+            header = json.loads(results_file.readline())
+        except ValueError:
+            return None
+
+    return header.get("settings") if isinstance(header, dict) else None
+
+def load_results(file_name):
+    """
+    Load the results recorded so far from a results file (a settings header, then one JSON object per line) as a map of
+    game id -> result. A missing file has no results; a truncated last line (from a tournament that was killed
+    mid-write) is ignored.
+    """
+    results = {}
+    if not os.path.isfile(file_name):
+        return results
+
+    with open(file_name) as results_file:
+        for line in results_file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if "game" in result:
+                results[result["game"]] = result
+
+    return results
+
+def crosstable(teams, results):
+    """
+    Tally results into a crosstable: a map of team -> opponent -> [wins, ties, losses], from the team's point of view.
+    """
+    table = { team: { opponent: [0, 0, 0] for opponent in teams if opponent != team } for team in teams }
+    for result in results:
+        red, blue = result["red"], result["blue"]
+        if red not in table or blue not in table:
+            continue
+
+        if result["winner"] == capitals.RED:
+            table[red][blue][0] += 1
+            table[blue][red][2] += 1
+        elif result["winner"] == capitals.BLUE:
+            table[blue][red][0] += 1
+            table[red][blue][2] += 1
+        else:
+            table[red][blue][1] += 1
+            table[blue][red][1] += 1
+
+    return table
+
+def ratings(table, iterations=200):
+    """
+    Fit Bradley-Terry strengths to a crosstable and return them on the Elo scale (centered on 1500), as a map of
+    team -> rating. Ties count as half a win for each side, and every pairing gets one extra virtual tie so that
+    undefeated or winless teams still have finite ratings. Unlike incremental Elo, the result doesn't depend on the
+    order games finished in.
+    """
+    teams = list(table)
+    score = {}
+    games = {}
+    for team in teams:
+        score[team] = 0.0
+        for opponent, (wins, ties, losses) in table[team].items():
+            score[team] += wins + 0.5 * ties + 0.5
+            games[(team, opponent)] = wins + ties + losses + 1
+
+    strength = { team: 1.0 for team in teams }
+    for _ in range(iterations):
+        updated = {}
+        for team in teams:
+            denominator = sum(games[(team, opponent)] / (strength[team] + strength[opponent])
+                    for opponent in table[team])
+            updated[team] = score[team] / denominator if denominator > 0 else 1.0
+
+        # Strengths are only determined up to a constant factor, so normalize their geometric mean to 1.
+        scale = math.exp(sum(math.log(value) for value in updated.values()) / len(teams)) if teams else 1.0
+        strength = { team: value / scale for team, value in updated.items() }
+
+    return { team: 1500 + 400 * math.log10(strength[team]) for team in teams }
+
+def run_tournament(teams, dictionary, results_file, games_per_pairing=2, turn_timeout=10, max_rounds=100, workers=1,
+        logdir=None, seed=None, verbose=True):
+    """
+    Play every game of a round-robin between the given team modules that isn't already in the results file, appending
+    each result (the winner and the runner.game_summary() of the game) to the file as soon as the game finishes.
+    Returns the map of game id -> result for all games.
+
+    The results file starts with a header recording the seed, max_rounds and turn_timeout its games were played with;
+    resuming a tournament with different settings raises ValueError, rather than mixing games played under both.
+
+    If logdir is not None, game logs are dumped to the given directory, named by game id. If seed is not None, each
+    game is played with seed <seed + crc32(game id)>, so a game's letters don't depend on which other teams or how many
+    games per pairing the tournament has. Unseeded games get seeds drawn here, rather than in the worker processes.
+    """
+    settings = { "seed": seed, "max_rounds": max_rounds, "turn_timeout": turn_timeout }
+    recorded = load_settings(results_file)
+    results = load_results(results_file)
+    if (recorded is not None or results) and recorded != settings:
+        raise ValueError("Results file %s was played with settings %s, not %s" % (results_file, recorded, settings))
+
+    competitors = { team: Competitor.from_module(team) for team in teams }
+
+    if logdir is not None:
+        if not os.path.isdir(logdir):
+            os.mkdir(logdir)
+
+    games = schedule(teams, games_per_pairing)
+    pending = []
+    tasks = []
+    for game_id, red, blue in games:
+        if game_id in results:
+            continue
+
+        logfile = os.path.join(logdir, game_id.replace("|", "-") + ".jsonl") if logdir is not None else None
+        options = { "max_rounds": max_rounds, "turn_timeout": turn_timeout, "verbose": False, "logfile": logfile,
+                "seed": seed + zlib.crc32(game_id.encode("utf-8")) if seed is not None else random.getrandbits(64) }
+        pending.append((game_id, red, blue))
+        tasks.append((competitors[red], competitors[blue], options))
+
+    if verbose:
+        print("%d of %d games already played" % (len(games) - len(tasks), len(games)))
+
+    pool = None
+    if workers > 1:
+        # Tasks are tagged with their index, since they finish out of order.
+        pool = multiprocessing.Pool(workers, runner.init_worker, (dictionary,))
+        finished = pool.imap_unordered(_indexed_game_task, list(enumerate(tasks)))
+    else:
+        runner.init_worker(dictionary)
+        finished = map(_indexed_game_task, enumerate(tasks))
+
+    try:
+        with open(results_file, "a+b") as results_out:
+            # A new file (or one killed before its header was written) starts with the settings header; otherwise,
+            # start on a fresh line if the last run was killed partway through writing a result.
+            if recorded is None:
+                results_out.truncate(0)
+                results_out.write((json.dumps({ "settings": settings }) + "\n").encode("utf-8"))
+                results_out.flush()
+            elif results_out.tell() > 0:
+                results_out.seek(-1, os.SEEK_END)
+                if results_out.read(1) != b"\n":
+                    results_out.write(b"\n")
+
+            for played, (index, (winner, summary)) in enumerate(finished):
+                game_id, red, blue = pending[index]
+                result = { "game": game_id, "red": red, "blue": blue, "winner": winner, "summary": summary }
+                results[game_id] = result
+                results_out.write((json.dumps(result) + "\n").encode("utf-8"))
+                results_out.flush()
+
+                if verbose:
+                    print("[%d/%d] %s (RED) vs. %s (BLUE): %s" % (len(games) - len(tasks) + played + 1, len(games),
+                            red, blue, winner or "TIE"))
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    return results
+
+def _indexed_game_task(indexed_task):
+    """
+    Play an (index, task) pair with runner.play_result_task, returning (index, (winner, game summary)).
+    """
+    index, task = indexed_task
+    return index, runner.play_result_task(task)
+
+def print_crosstable(teams, table, team_ratings):
+    """
+    Print the crosstable, one row per team from best to worst rating, with W-T-L against each opponent and in total.
+    """
+    names = { team: team.split(".")[-1] for team in teams }
+    ordered = sorted(teams, key=lambda team: -team_ratings[team])
+    width = max([len(names[team]) for team in teams] + [8])
+
+    print(" ".join([" " * width] + ["%*s" % (width, names[team]) for team in ordered] + ["%*s" % (width, "Total"),
+            "Rating"]))
+    for team in ordered:
+        cells = []
+        for opponent in ordered:
+            cells.append("%*s" % (width, "-" if opponent == team else "%d-%d-%d" % tuple(table[team][opponent])))
+        total = [sum(record[i] for record in table[team].values()) for i in range(3)]
+        print(" ".join(["%-*s" % (width, names[team])] + cells + ["%*s" % (width, "%d-%d-%d" % tuple(total)),
+                "%6.0f" % team_ratings[team]]))
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Run a round-robin tournament between every AI in teams/")
+    argparser.add_argument("--teams", type=str, nargs="*", default=None, help="Teams to play (default: all of them)")
+    argparser.add_argument("--games", type=int, default=2, help="Number of games per pairing")
+    argparser.add_argument("--max_rounds", type=int, default=100, help="Maximum number of rounds per game")
+    argparser.add_argument("--turn_timeout", type=int, default=10, help="Number of seconds allowed per turn")
+    argparser.add_argument("--workers", type=int, default=1, help="Number of processes to play games in parallel")
+    argparser.add_argument("--results", type=str, default="tournament.jsonl",
+            help="File to record results in; existing results are kept and their games are not replayed")
+    argparser.add_argument("--logdir", type=str, default=None, help="Directory to dump log files to")
+    argparser.add_argument("--seed", type=int, default=None, help="Seed for reproducible games")
+    args = argparser.parse_args()
+
+    teams = ["teams." + team for team in args.teams] if args.teams else find_teams()
+    for team in list(teams):
+        try:
+            Competitor.from_module(team)
+        except ValueError:
+            print("Failed to load agent '%s', skipping it" % team)
+            teams.remove(team)
+
+    if len(teams) < 2:
+        print("A tournament needs at least two teams")
+        sys.exit(1)
+
+    dictionary = Dictionary.from_compiled("dict.txt")
+    print("Dictionary: %d words" % len(dictionary))
+    print("Tournament: %s (%d games/pairing, %d rounds/game)" % (", ".join(teams), args.games, args.max_rounds))
+
+    try:
+        results = run_tournament(teams, dictionary, args.results, games_per_pairing=args.games,
+                turn_timeout=args.turn_timeout, max_rounds=args.max_rounds, workers=args.workers, logdir=args.logdir,
+                seed=args.seed)
+    except ValueError as error:
+        print(error)
+        sys.exit(1)
+
+    table = crosstable(teams, results.values())
+    print()
+    print("== CROSSTABLE ==")
+    print_crosstable(teams, table, ratings(table))